@@ -0,0 +1,147 @@
+"""Замер задержки, числа SQL-запросов и памяти на основных эндпоинтах.
+
+Сценарии выполняются тестовым клиентом DRF на наборе данных из
+recipes.seed. Результат — словарь {сценарий: показатели}, который
+можно сохранить в JSON и сравнить с эталоном функцией compare.
+"""
+import gc
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Cart, Ingredient, IngredientRecipe
+
+User = get_user_model()
+
+# Абсолютный допуск: на малых значениях относительный порог
+# срабатывал бы от шума.
+SLACK = {'p95_ms': 5, 'memory_kb': 64}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def make_scenarios(dataset):
+    """Возвращает {имя: (пользователь или None, путь, параметры)}."""
+    reader = User.objects.filter(
+        pk__in=Cart.objects.values('user')
+    ).order_by('-followers_count', 'pk').first()
+    reader = reader or User.objects.get(pk=dataset['user_ids'][0])
+    recipe_id = dataset['recipe_ids'][0]
+    query = Ingredient.objects.order_by('name').values_list(
+        'name', flat=True).first()[:3]
+    pantry = ','.join(map(str, IngredientRecipe.objects.values_list(
+        'ingredient', flat=True).annotate(
+            total=Count('pk')).order_by('-total', 'ingredient')[:10]))
+    return {
+        'recipe_list_anonymous': (None, '/api/recipes/', {'limit': 6}),
+        'recipe_list': (reader, '/api/recipes/', {'limit': 6}),
+        'recipe_list_popular': (
+            reader, '/api/recipes/', {'limit': 6, 'ordering': 'popular'}),
+        'recipe_list_cookable': (reader, '/api/recipes/', {
+            'limit': 6, 'available_ingredients': pantry, 'max_missing': 2}),
+        'recipe_detail': (reader, f'/api/recipes/{recipe_id}/', {}),
+        'recipe_similar': (
+            reader, f'/api/recipes/{recipe_id}/similar/', {}),
+        'download_shopping_cart': (
+            reader, '/api/recipes/download_shopping_cart/', {}),
+        'feed': (reader, '/api/recipes/feed/', {'limit': 6}),
+        'subscriptions': (
+            reader, '/api/users/subscriptions/', {'recipes_limit': 3}),
+        'ingredient_search': (None, '/api/ingredients/', {'name': query}),
+    }
+
+
+def request(client, path, params):
+    response = client.get(path, params)
+    if response.status_code != 200:
+        raise AssertionError(
+            f'{path} вернул {response.status_code}: '
+            f'{response.content[:200]}')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(user, path, params, repeat=30, warmup=3):
+    """Замеряет один сценарий.
+
+    Сборщик мусора на время замеров отключается, как в timeit, чтобы
+    его паузы не попадали в задержку. Память замеряется отдельными
+    проходами: tracemalloc заметно замедляет выполнение.
+    """
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    for _ in range(warmup):
+        request(client, path, params)
+    timings = []
+    queries = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                request(client, path, params)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+    finally:
+        gc.enable()
+    peaks = []
+    for _ in range(3):
+        tracemalloc.start()
+        request(client, path, params)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'queries': max(queries),
+        'memory_kb': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def run(dataset, repeat=30, warmup=3, only=None, progress=None):
+    results = {}
+    for name, (user, path, params) in make_scenarios(dataset).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(user, path, params, repeat, warmup)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def compare(results, baseline, threshold=0.5):
+    """Возвращает список регрессий относительно эталона.
+
+    Рост числа запросов считается регрессией всегда, задержка p95 и
+    память — если превышают эталон больше чем на долю threshold и
+    больше чем на абсолютный допуск SLACK.
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if actual['queries'] > expected['queries']:
+            regressions.append(
+                f'{name}: запросов {actual["queries"]} '
+                f'вместо {expected["queries"]}')
+        for metric, slack in SLACK.items():
+            limit = max(
+                expected[metric] * (1 + threshold), expected[metric] + slack)
+            if actual[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {actual[metric]} '
+                    f'при эталоне {expected[metric]}')
+    return regressions
@@ -0,0 +1,81 @@
+"""Потоковая выгрузка списка покупок в разных форматах.
+
+Каждая функция render_* принимает итератор строк
+(название, единица измерения, количество) и отдаёт файл по частям.
+"""
+import csv
+import json
+
+from django.conf import settings
+from fpdf import FPDF
+
+from recipes.models import ShoppingListItem
+
+CHUNK_SIZE = 500
+
+HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_rows(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).order_by('ingredient__name').values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def render_txt(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name} ({measurement_unit}) кол-во: {amount}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    # BOM нужен, чтобы Excel распознал кириллицу в UTF-8.
+    yield '\ufeff' + writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    separator = ''
+    yield '['
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def render_pdf(rows):
+    # Таблица перекрёстных ссылок PDF пишется в конце документа,
+    # поэтому сам файл собирается целиком, а строки читаются курсором.
+    pdf = FPDF()
+    pdf.add_font('DejaVu', fname=settings.SHOPPING_LIST_PDF_FONT)
+    pdf.add_page()
+    pdf.set_font('DejaVu', size=16)
+    pdf.cell(0, 10, 'Список покупок', new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font('DejaVu', size=11)
+    for name, measurement_unit, amount in rows:
+        pdf.cell(120, 8, name)
+        pdf.cell(0, 8, f'{amount} {measurement_unit}',
+                 new_x='LMARGIN', new_y='NEXT')
+    yield bytes(pdf.output())
+
+
+EXPORTS = {
+    'txt': (render_txt, 'cart-list.txt'),
+    'csv': (render_csv, 'cart-list.csv'),
+    'json': (render_json, 'cart-list.json'),
+    'pdf': (render_pdf, 'cart-list.pdf'),
+}
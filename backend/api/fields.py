@@ -0,0 +1,92 @@
+import base64
+import binascii
+import uuid
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework import serializers
+
+
+class Base64ImageField(serializers.ImageField):
+    """Изображение, переданное строкой base64, data URI или файлом.
+
+    Строка декодируется порциями во временный файл, который хранится в
+    памяти до SPOOL_SIZE и затем сбрасывается на диск, поэтому целиком
+    раскодированные байты в памяти не держатся. Размер проверяется по
+    длине строки ещё до декодирования, а формат и размеры — по
+    заголовку файла, без декодирования растра. Файл из multipart-запроса
+    проверяется так же.
+    """
+
+    # кратно 4, чтобы порции base64 декодировались независимо
+    CHUNK_SIZE = 64 * 1024
+    SPOOL_SIZE = 1024 * 1024
+    FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_format': 'Поддерживаются изображения JPEG, PNG, GIF и WebP.',
+        'too_large': 'Размер изображения не должен превышать {max_size} МБ.',
+        'too_many_pixels': 'Изображение слишком большое: {width}x{height}.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif not hasattr(data, 'read'):
+            self.fail('invalid_image')
+        if data.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.fail_too_large()
+        extension = self.check_header(data)
+        data.name = f'{uuid.uuid4().hex}.{extension}'
+        return data
+
+    def fail_too_large(self):
+        self.fail(
+            'too_large',
+            max_size=settings.RECIPE_IMAGE_MAX_BYTES // (1024 * 1024))
+
+    def decode(self, data):
+        if data.startswith('data:'):
+            _, _, data = data.partition(';base64,')
+        # Оценка размера сверху: 3 байта на каждые 4 символа.
+        if len(data) // 4 * 3 > settings.RECIPE_IMAGE_MAX_BYTES + 2:
+            self.fail_too_large()
+        file = SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        rest = ''
+        try:
+            for start in range(0, len(data), self.CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    data[start:start + self.CHUNK_SIZE].split())
+                usable = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:usable], validate=True))
+                rest = chunk[usable:]
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        if rest or not file.tell():
+            file.close()
+            self.fail('invalid_image')
+        size = file.tell()
+        file.seek(0)
+        decoded = File(file)
+        decoded.size = size
+        return decoded
+
+    def check_header(self, file):
+        """Проверяет формат и размеры, не декодируя растр."""
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if image_format not in self.FORMATS:
+            self.fail('invalid_format')
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', width=width, height=height)
+        return self.FORMATS[image_format]
@@ -1,18 +1,67 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 from django_filters import rest_framework as django_filter
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Recipe
+from recipes import cookable, ingredient_index, search, versions
+from recipes.models import Ingredient, Recipe, Tag, TagRecipe
 
 User = get_user_model()
 
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'recent': ('-pub_date', '-id'),
+    'quick': ('cooking_time', '-pub_date', '-id'),
+}
+# фильтры, которые сами сортируют результат, пока не задан ?ordering
+RANKED_FILTERS = ('search', 'available_ingredients')
+
+
+def get_tag_ids(slugs):
+    """Переводит slug тегов в id по закэшированному словарю.
+
+    Словарь хранится в кэше под версией набора тегов и перестраивается
+    только после изменения тегов. Неизвестные slug пропускаются.
+    """
+    version, _ = versions.get(versions.TAGS)
+    key = f'{versions.TAGS}:slugs:{version}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, None)
+    return {tag_ids[slug] for slug in slugs if slug in tag_ids}
+
+
+def filter_by_tags(queryset, tag_ids):
+    """Рецепты хотя бы с одним из тегов, без повторов строк."""
+    return queryset.filter(Exists(TagRecipe.objects.filter(
+        recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
 
 class RecipeFilter(django_filter.FilterSet):
-    tags = django_filter.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filter.CharFilter(method='filter_tags')
     author = django_filter.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = django_filter.BooleanFilter(method='filter_favorite')
     is_in_shopping_cart = django_filter.BooleanFilter(
         method='filter_cart')
+    search = django_filter.CharFilter(method='filter_search')
+    available_ingredients = django_filter.CharFilter(
+        method='filter_available_ingredients')
+    ordering = django_filter.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in RECIPE_ORDERINGS],
+        method='filter_ordering',
+    )
+
+    def filter_tags(self, queryset, name, value):
+        # Параметр повторяется: ?tags=lunch&tags=dinner. EXISTS по
+        # TagRecipe не размножает рецепт с несколькими подходящими тегами.
+        tag_ids = get_tag_ids(self.data.getlist(name))
+        if not tag_ids:
+            return queryset.none()
+        return filter_by_tags(queryset, tag_ids)
 
     def filter_favorite(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -24,13 +73,59 @@ class RecipeFilter(django_filter.FilterSet):
             return queryset.filter(carts__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        # Сортирует по релевантности; явный ?ordering применяется позже
+        # и заменяет её.
+        return search.search(queryset, value)
+
+    def filter_available_ingredients(self, queryset, name, value):
+        # ?available_ingredients=1,2&available_ingredients=3 — id
+        # ингредиентов, ?max_missing=1 — сколько может не хватать.
+        # Как и поиск, задаёт сортировку, которую заменяет ?ordering.
+        try:
+            ingredient_ids = {
+                int(pk) for values in self.data.getlist(name)
+                for pk in values.split(',') if pk.strip()
+            }
+            max_missing = self.data.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            raise ValidationError(
+                {name: 'Укажите id ингредиентов и max_missing числами.'})
+        if len(ingredient_ids) > cookable.MAX_INGREDIENTS:
+            raise ValidationError({name: (
+                f'Можно указать не больше {cookable.MAX_INGREDIENTS} '
+                f'ингредиентов.')})
+        return cookable.cookable(queryset, ingredient_ids, max_missing)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'tags', 'author')
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'tags', 'author',
+            'search', 'available_ingredients', 'ordering'
+        )
 
 
 class IngredientSearchFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='icontains')
+    name = filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        try:
+            limit = int(self.data.get('limit'))
+        except (TypeError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        ids = ingredient_index.search(value, limit)
+        if not ids:
+            return queryset.none()
+        position = Case(
+            *(When(pk=pk, then=Value(index)) for index, pk in enumerate(ids)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).order_by(position)
 
     class Meta:
         model = Ingredient
@@ -0,0 +1,139 @@
+import io
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+
+from api import benchmark
+from recipes import seed
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'benchmark_baseline.json'
+DEFAULT_INGREDIENTS = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число SQL-запросов и память основных '
+        'эндпоинтов на тестовой БД и сравнивает результат с эталоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=200,
+            help='Количество пользователей в наборе данных.',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=2000,
+            help='Количество рецептов в наборе данных.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора набора данных.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            help=(
+                'Файл справочника ингредиентов для загрузки в тестовую БД, '
+                f'по умолчанию {DEFAULT_INGREDIENTS}, если он есть.'
+            ),
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=30,
+            help='Количество замеров на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Количество запросов перед замерами.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанный сценарий, можно повторять.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Записать результат в JSON-файл.',
+        )
+        parser.add_argument(
+            '--baseline', default=DEFAULT_BASELINE,
+            help='JSON-файл эталона для сравнения.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.5,
+            help='Допустимый рост p95 и памяти относительно эталона.',
+        )
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Сохранить результат как новый эталон.',
+        )
+
+    def handle(self, *args, **options):
+        results = self.run(options)
+        report = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
+            self.stdout.write(f'Эталон сохранён в {options["baseline"]}')
+            return
+        try:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            self.stdout.write('Эталон не найден, сравнение пропущено.')
+            return
+        regressions = benchmark.compare(
+            results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def run(self, options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media, CACHES=BENCHMARK_CACHES
+            ):
+                ingredients = options['ingredients'] or (
+                    DEFAULT_INGREDIENTS if DEFAULT_INGREDIENTS.exists()
+                    else None)
+                if ingredients:
+                    call_command(
+                        'import_ingredients', str(ingredients),
+                        stdout=io.StringIO())
+                dataset = seed.seed(
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    random_seed=options['seed'],
+                )
+                call_command('update_similar_recipes', stdout=io.StringIO())
+                return benchmark.run(
+                    dataset,
+                    repeat=options['repeat'],
+                    warmup=options['warmup'],
+                    only=options['scenarios'],
+                    progress=self.progress,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def progress(self, name, result):
+        self.stdout.write(
+            f'{name}: p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+            f'запросов {result["queries"]}, память {result["memory_kb"]} КБ')
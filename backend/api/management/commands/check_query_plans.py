@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.query_plans import explain, find_problems, get_checks
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет через EXPLAIN, что основные запросы API используют '
+        'индексы. На PostgreSQL последовательное чтение запрещается на '
+        'время проверки, чтобы результат не зависел от объёма данных.'
+    )
+
+    def handle(self, *args, **options):
+        failed = 0
+        with transaction.atomic():
+            for name, queryset, table, index, seek in get_checks():
+                plan = explain(queryset)
+                problems = find_problems(
+                    plan, table, index, queryset.query.order_by, seek)
+                if problems:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: {", ".join(problems)}'))
+                else:
+                    self.stdout.write(f'{name}: OK')
+                if problems or options['verbosity'] > 1:
+                    self.stdout.write(plan)
+        if failed:
+            raise CommandError(f'Запросов без нужных индексов: {failed}')
@@ -1,4 +1,14 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
+
+from recipes import versions
 
 
 class CreateUpdateRetrieveViewSet(
@@ -7,3 +17,74 @@ class CreateUpdateRetrieveViewSet(
     mixins.RetrieveModelMixin, viewsets.GenericViewSet
 ):
     ...
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы по версии набора данных.
+
+    Ответ получает ETag и Last-Modified из счётчика версий, а на запрос
+    с актуальным If-None-Match/If-Modified-Since отдаётся 304 без
+    обращения к queryset и сериализатору.
+    """
+
+    data_version = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        version, updated_at = versions.get(self.data_version)
+        etag = quote_etag(
+            f'{self.data_version}-{version}-{request.accepted_renderer.format}'
+        )
+        last_modified = updated_at and int(updated_at.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class AnonymousListCacheMixin:
+    """Кэширование страниц списка для анонимных пользователей.
+
+    Ключ кэша строится из нормализованных параметров запроса и версии
+    набора данных cache_version, поэтому при изменении данных старые
+    записи просто перестают использоваться. Авторизованные пользователи
+    получают персональные поля и идут мимо кэша.
+    """
+
+    cache_version = None
+    cache_timeout = settings.RECIPE_LIST_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = self.get_list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+    def get_list_cache_key(self, request):
+        version, _ = versions.get(self.cache_version)
+        params = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in set(values) if value
+        ))
+        digest = hashlib.md5('|'.join((
+            request.get_host(), request.accepted_renderer.format, params
+        )).encode()).hexdigest()
+        return f'{self.cache_version}:list:{version}:{digest}'
@@ -1,6 +1,237 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.timeline import after
+
+
+def planner_estimate(queryset):
+    """Оценка числа строк планировщиком PostgreSQL или None."""
+    connection = connections[queryset.db]
+    queryset = queryset.order_by()
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows']) or None
+
+
+def count_queryset(queryset):
+    """Возвращает пару (количество, признак приблизительного значения).
+
+    До PAGINATION_EXACT_COUNT_THRESHOLD строк считается точно. Для
+    больших выборок на PostgreSQL берётся оценка планировщика, на других
+    СУБД - точное значение, закэшированное на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд.
+    """
+    threshold = settings.PAGINATION_EXACT_COUNT_THRESHOLD
+    bounded = queryset.order_by()[:threshold + 1].count()
+    if bounded <= threshold:
+        return bounded, False
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = planner_estimate(queryset)
+        if estimate is not None:
+            return max(estimate, bounded), True
+    key = 'count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is not None:
+        return count, True
+    count = queryset.count()
+    cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count, False
+
+
+class ApproximateCountPage(Page):
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator, который не считает точное количество больших выборок.
+
+    Если количество приблизительное, номер страницы не сверяется с ним,
+    а наличие следующей страницы определяется лишней записью в выборке.
+    """
+
+    @cached_property
+    def count_info(self):
+        if isinstance(self.object_list, list):
+            return len(self.object_list), False
+        return count_queryset(self.object_list)
+
+    @property
+    def count(self):
+        return self.count_info[0]
+
+    @property
+    def count_is_approximate(self):
+        return self.count_info[1]
+
+    def validate_number(self, number):
+        if not self.count_is_approximate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('Страница не содержит результатов')
+        page = ApproximateCountPage(objects[:self.per_page], number, self)
+        page.has_more = len(objects) > self.per_page
+        return page
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response(OrderedDict([
+            ('count', paginator.count),
+            ('count_is_approximate', paginator.count_is_approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class RecipeCursorPagination(BasePagination):
+    """Курсорная пагинация ленты рецептов по (pub_date, id).
+
+    Каждая страница выбирается условием по ключу последней записи
+    предыдущей страницы, поэтому глубокие страницы не требуют OFFSET.
+    Общее количество считается только по запросу ?count=true.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = self.count_is_approximate = None
+        if request.query_params.get(self.count_query_param) in (
+                '1', 'true', 'True'):
+            self.count, self.count_is_approximate = count_queryset(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+        page = self.fetch(queryset, cursor)
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def fetch(self, queryset, cursor):
+        """До page_size + 1 записей после курсора."""
+        return list(after(queryset, 'id', cursor)[:self.page_size + 1])
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk, direction = base64.urlsafe_b64decode(
+                encoded.encode()).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None or direction not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk, direction == 'p'
+
+    def encode_cursor(self, recipe, direction):
+        value = f'{recipe.pub_date.isoformat()}|{recipe.pk}|{direction}'
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url, self.cursor_query_param,
+            base64.urlsafe_b64encode(value.encode()).decode())
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], 'n')
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], 'p')
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_is_approximate'] = self.count_is_approximate
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Курсорная пагинация ленты подписок recipes.timeline.Feed.
+
+    Количество записей для ленты не считается.
+    """
+
+    count_query_param = None
+
+    def fetch(self, feed, cursor):
+        return feed.page(cursor, self.page_size + 1)
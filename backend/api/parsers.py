@@ -0,0 +1,42 @@
+import json
+
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data, в котором вложенные поля переданы JSON-строкой.
+
+    Поля из атрибута multipart_json_fields представления декодируются из
+    JSON, остальные передаются строками, файлы — как есть. Данные
+    возвращаются обычным словарём той же формы, что и в JSON-запросе,
+    поэтому сериализатор проверяет их одинаково. Файлы принимаются
+    стандартными обработчиками загрузки Django: большие сразу пишутся
+    во временный файл на диске.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get('view')
+        json_fields = getattr(view, 'multipart_json_fields', ())
+        data = {}
+        for key, values in parsed.data.lists():
+            if key not in json_fields:
+                data[key] = values[-1]
+            elif len(values) > 1:
+                # Допускается и повтор поля: tags=1&tags=2, каждое
+                # значение тоже JSON.
+                data[key] = [self.decode(value) for value in values]
+            else:
+                data[key] = self.decode(values[0])
+        # DRF объединяет данные и файлы через dict.update, который у
+        # MultiValueDict берёт списки значений, поэтому нужен обычный dict.
+        return DataAndFiles(data, parsed.files.dict())
+
+    @staticmethod
+    def decode(value):
+        try:
+            return json.loads(value)
+        except ValueError:
+            # Некорректное значение отклонит сериализатор с тем же
+            # сообщением, что и для JSON-запроса.
+            return value
@@ -0,0 +1,188 @@
+"""Проверка планов основных запросов API через EXPLAIN.
+
+Используется тестами api и командой check_query_plans, которая
+проверяет те же запросы на рабочей базе.
+"""
+import re
+
+from django.db import connection
+from django.utils import timezone
+
+from recipes.cookable import cookable
+from recipes.models import (
+    Cart, Favorite, IngredientRecipe, Recipe, ShoppingListItem,
+    SimilarRecipe, TimelineEntry
+)
+from recipes.timeline import after
+from users.models import Subscribe
+
+from .filters import RECIPE_ORDERINGS, filter_by_tags
+
+# Планы строятся для произвольных id: EXPLAIN без ANALYZE запрос не
+# выполняет, поэтому данные в базе не нужны.
+ID = 1
+
+
+def get_checks():
+    """Возвращает кортежи (название, запрос, таблица, индекс, столбец).
+
+    Индекс — ожидаемый в плане индекс или None. Столбец задаётся для
+    страниц после курсора: просмотр индекса должен начинаться с условия
+    по этому столбцу, а не с начала индекса.
+    """
+    recipes = Recipe.objects.all()
+    cursor = (timezone.now(), ID, False)
+    checks = [
+        (
+            f'лента рецептов ?ordering={ordering}',
+            recipes.order_by(*fields)[:6],
+            Recipe._meta.db_table,
+            index,
+            None,
+        )
+        for (ordering, fields), index in zip(RECIPE_ORDERINGS.items(), (
+            'recipe_popularity_idx',
+            'recipe_pub_date_id_idx',
+            'recipe_cooking_time_idx',
+        ))
+    ]
+    return checks + [
+        (
+            'рецепты автора',
+            recipes.filter(author_id=ID).order_by('-pub_date', '-id')[:6],
+            Recipe._meta.db_table,
+            'recipe_author_pub_date_idx',
+            None,
+        ),
+        (
+            'фильтр по тегам',
+            filter_by_tags(recipes, [ID, ID + 1]),
+            'recipes_tagrecipe',
+            None,
+            None,
+        ),
+        (
+            # сортировка по числу недостающих ингредиентов неизбежна
+            'подбор по ингредиентам',
+            cookable(recipes, [ID, ID + 1], max_missing=1).order_by(),
+            IngredientRecipe._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'лента подписок',
+            TimelineEntry.objects.filter(user=ID).order_by(
+                '-pub_date', '-recipe')[:7],
+            TimelineEntry._meta.db_table,
+            'timeline_user_pub_date_idx',
+            None,
+        ),
+        (
+            'лента рецептов после курсора',
+            after(recipes, 'id', cursor)[:7],
+            Recipe._meta.db_table,
+            'recipe_pub_date_id_idx',
+            'pub_date',
+        ),
+        (
+            'лента подписок после курсора',
+            after(
+                TimelineEntry.objects.filter(user=ID), 'recipe_id', cursor
+            )[:7],
+            TimelineEntry._meta.db_table,
+            'timeline_user_pub_date_idx',
+            'pub_date',
+        ),
+        (
+            'похожие рецепты',
+            SimilarRecipe.objects.filter(recipe=ID).order_by('-score'),
+            SimilarRecipe._meta.db_table,
+            'similar_recipe_score_idx',
+            None,
+        ),
+        (
+            'фильтр is_favorited',
+            recipes.filter(favorites__user=ID),
+            Favorite._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'рецепт в избранном',
+            Favorite.objects.filter(user=ID, recipe=ID),
+            Favorite._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'рецепт в корзине',
+            Cart.objects.filter(user=ID, recipe=ID),
+            Cart._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'подписки пользователя',
+            Subscribe.objects.filter(user=ID),
+            Subscribe._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'список покупок',
+            ShoppingListItem.objects.filter(user=ID),
+            ShoppingListItem._meta.db_table,
+            None,
+            None,
+        ),
+        (
+            'ингредиенты рецепта',
+            IngredientRecipe.objects.filter(recipe=ID),
+            IngredientRecipe._meta.db_table,
+            None,
+            None,
+        ),
+    ]
+
+
+def seeks(plan, index, column):
+    """Есть ли в плане поиск по индексу с условием на column."""
+    if connection.vendor == 'postgresql':
+        return re.search(
+            rf'Index (Only )?Scan.* using {index} on .*\n'
+            rf'(\s+.*\n)*?\s+Index Cond: .*\b{column}\b', plan) is not None
+    return re.search(
+        rf'SEARCH .* INDEX {index} \([^)]*\b{column}[<>]', plan) is not None
+
+
+def find_problems(plan, table, index, ordered, seek=None):
+    problems = []
+    if connection.vendor == 'postgresql':
+        if f'Seq Scan on {table}' in plan:
+            problems.append(f'полный просмотр {table}')
+        if ordered and re.search(r'^\s*(->\s+)?(Incremental )?Sort\b',
+                                 plan, re.MULTILINE):
+            problems.append('сортировка без индекса')
+    else:
+        for line in plan.splitlines():
+            if re.search(rf'\bSCAN {table}\b', line) and 'USING' not in line:
+                problems.append(f'полный просмотр {table}')
+        if ordered and 'TEMP B-TREE FOR ORDER BY' in plan:
+            problems.append('сортировка без индекса')
+    if index and index not in plan:
+        problems.append(f'не используется индекс {index}')
+    elif seek and not seeks(plan, index, seek):
+        problems.append(f'просмотр {index} не ограничен условием на {seek}')
+    return problems
+
+
+def explain(queryset):
+    """План запроса; на PostgreSQL вызывать внутри транзакции.
+
+    Последовательное чтение запрещается до конца транзакции, чтобы план
+    не зависел от объёма данных.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
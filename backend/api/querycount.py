@@ -0,0 +1,31 @@
+"""Вспомогательные функции для проверки количества SQL-запросов."""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def count_queries(client, path, **params):
+    """Выполняет GET-запрос и возвращает количество SQL-запросов к БД."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path, params)
+    assert response.status_code == 200, (
+        f'{path} вернул {response.status_code}: {response.content[:200]}'
+    )
+    return len(context.captured_queries)
+
+
+def assert_constant_queries(client, path, param='limit', values=(6, 100),
+                            **params):
+    """Проверяет, что число запросов не растёт вместе с параметром param.
+
+    Пример: assert_constant_queries(client, '/api/recipes/') убедится,
+    что страница из 6 и из 100 рецептов загружается одинаковым числом
+    запросов.
+    """
+    counts = {
+        value: count_queries(client, path, **{**params, param: value})
+        for value in values
+    }
+    assert len(set(counts.values())) == 1, (
+        f'Количество запросов к {path} зависит от {param}: {counts}'
+    )
+    return counts[values[0]]
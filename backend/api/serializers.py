@@ -1,14 +1,18 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes import counters, shopping_list, signals, thumbnails
 from recipes.models import (
-    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag
+    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag, TagRecipe
 )
 from users.models import Subscribe
 
+from .fields import Base64ImageField
+
 User = get_user_model()
 
 
@@ -29,6 +33,9 @@ class CustomUserSerializer(UserSerializer):
         return super(CustomUserSerializer, self).create(validated_data)
 
     def get_is_subscribed(self, obj):
+        subscribed = getattr(obj, 'subscribed', None)
+        if subscribed is not None:
+            return subscribed
         if self.context['request'].user.is_authenticated:
             return Subscribe.objects.filter(
                 author=obj, user=self.context['request'].user
@@ -55,6 +62,30 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ImageVariantsMixin(serializers.Serializer):
+    """Ссылки на уменьшенные копии изображения рецепта.
+
+    Пока копии не построены, image_variants равно null и клиент
+    использует оригинал из поля image.
+    """
+
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        if not obj.has_thumbnails:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for variant, names in thumbnails.variant_names(obj.image.name).items():
+            urls[variant] = {}
+            for extension, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][extension] = url
+        return urls
+
+
 class IngredientRecapeSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
@@ -68,7 +99,7 @@ class IngredientRecapeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     tags = TagSerializer(
         many=True,
         read_only=True
@@ -88,64 +119,190 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'tags', 'author', 'name', 'text', 'image', 'ingredients',
-            'cooking_time', 'is_favorited', 'is_in_shopping_cart'
+            'id', 'tags', 'author', 'name', 'text', 'image', 'image_variants',
+            'ingredients', 'cooking_time', 'is_favorited',
+            'is_in_shopping_cart'
         )
 
-    def set_ingredients(self, ingredients, recipe):
+    def validate_image(self, image):
+        try:
+            return thumbnails.normalize(image)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+    def validate_ingredient_list(self, ingredients):
+        if not isinstance(ingredients, list) or not ingredients:
+            raise serializers.ValidationError(
+                {'ingredients': 'Нужно указать хотя бы один ингредиент.'})
+        amounts = {}
         for ingredient in ingredients:
-            IngredientRecipe.objects.create(
-                ingredient_id=ingredient.get('id'),
-                recipe=recipe,
-                amount=ingredient.get(
-                    'amount'))
+            try:
+                ingredient_id = int(ingredient['id'])
+                amount = int(ingredient['amount'])
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError(
+                    {'ingredients': 'Ингредиент задаётся полями id и amount.'})
+            if amount < 1:
+                raise serializers.ValidationError(
+                    {'ingredients': 'Количество ингредиента не может быть '
+                                    'меньше одного.'})
+            if ingredient_id in amounts:
+                raise serializers.ValidationError(
+                    {'ingredients': 'Ингредиенты не должны повторяться.'})
+            amounts[ingredient_id] = amount
+        existing = set(Ingredient.objects.filter(
+            id__in=amounts).values_list('id', flat=True))
+        if existing != set(amounts):
+            raise serializers.ValidationError(
+                {'ingredients': 'Указан несуществующий ингредиент.'})
+        return amounts
 
-    def create(self, validated_data):
+    def validate_tag_list(self, tags):
+        if not isinstance(tags, list) or not tags:
+            raise serializers.ValidationError(
+                {'tags': 'Нужно указать хотя бы один тег.'})
+        try:
+            tag_ids = {int(tag) for tag in tags}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(
+                {'tags': 'Тег задаётся своим id.'})
+        if len(tag_ids) != len(tags):
+            raise serializers.ValidationError(
+                {'tags': 'Теги не должны повторяться.'})
+        existing = set(Tag.objects.filter(
+            id__in=tag_ids).values_list('id', flat=True))
+        if existing != tag_ids:
+            raise serializers.ValidationError(
+                {'tags': 'Указан несуществующий тег.'})
+        return tag_ids
+
+    def validate(self, attrs):
         ingredients = self.initial_data.get('ingredients')
-        tags_data = self.initial_data.get('tags')
-        image = validated_data.pop('image')
-        recipe = Recipe.objects.create(image=image, **validated_data)
-        recipe.tags.set(tags_data)
-        self.set_ingredients(ingredients, recipe)
+        tags = self.initial_data.get('tags')
+        if not self.partial or ingredients is not None:
+            attrs['ingredients'] = self.validate_ingredient_list(ingredients)
+        if not self.partial or tags is not None:
+            attrs['tags'] = self.validate_tag_list(tags)
+        return attrs
+
+    def set_tags(self, recipe, tag_ids):
+        current = set(TagRecipe.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        removed = current - tag_ids
+        if removed:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in tag_ids - current
+        )
+
+    def set_ingredients(self, recipe, amounts):
+        """Приводит ингредиенты рецепта к amounts, возвращает изменённые.
+
+        Строки пишутся пачкой, сигналы на каждую строку ничего не
+        делают (см. signals.bulk): счётчик меняется здесь одним
+        запросом, версию и поисковые данные обновляет сигнал сохранения
+        самого рецепта, список покупок пересчитывает update().
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            with signals.bulk():
+                IngredientRecipe.objects.filter(
+                    recipe=recipe, ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        created = IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        if len(created) != len(removed):
+            counters.increment(
+                Recipe, recipe.pk, 'ingredients_count',
+                len(created) - len(removed))
+        return (
+            removed | amounts.keys() - current.keys()
+            | {row.ingredient_id for row in changed}
+        )
+
+    def create(self, validated_data):
+        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags')
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self.set_tags(recipe, tags)
+            self.set_ingredients(recipe, ingredients)
         return recipe
 
+    def update(self, instance, validated_data):
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if tags is not None:
+                self.set_tags(instance, tags)
+            if ingredients is not None:
+                changed = self.set_ingredients(instance, ingredients)
+                shopping_list.refresh_recipe(instance, changed)
+        return instance
+
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return False
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context['request'].user
+        if not user.is_authenticated:
+            return False
         return Cart.objects.filter(user=user, recipe=obj).exists()
 
 
-class SubscriptionsRecipeSerializer(serializers.ModelSerializer):
+class SubscriptionsRecipeSerializer(
+    ImageVariantsMixin, serializers.ModelSerializer
+):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscribeSerializer(CustomUserSerializer):
-    email = serializers.ReadOnlyField(source='author.email')
-    id = serializers.ReadOnlyField(source='author.id')
-    username = serializers.ReadOnlyField(source='author.username')
-    first_name = serializers.ReadOnlyField(source='author.first_name')
-    last_name = serializers.ReadOnlyField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField()
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
+    def get_is_subscribed(self, obj):
+        return True
+
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj)
-        if 'recipes_limit' in self.context:
-            recipes_limit = int(self.context['recipes_limit'])
-            queryset = Recipe.objects.filter(author=obj)[:recipes_limit]
-        return SubscriptionsRecipeSerializer(queryset, many=True).data
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj)
+            if self.context.get('recipes_limit'):
+                recipes = recipes[:int(self.context['recipes_limit'])]
+        return SubscriptionsRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
 
     class Meta:
         model = User
@@ -0,0 +1,434 @@
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes import counters, search, seed, shopping_list
+from recipes.models import (
+    Cart, Ingredient, IngredientRecipe, Recipe, ShoppingListItem, Tag
+)
+from users.models import Subscribe
+
+from .query_plans import explain, find_problems, get_checks
+from .querycount import assert_constant_queries, count_queries
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_file(name='recipe.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (20, 20), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeTestCase(TestCase):
+    """Автор, теги и ингредиенты для тестов записи рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password')
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', Tag.YELLOW, 'breakfast'),
+                ('Обед', Tag.RED, 'lunch'),
+            )
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def amounts(self, recipe_id):
+        return dict(IngredientRecipe.objects.filter(
+            recipe=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+class RecipeWriteTests(RecipeTestCase):
+    """Создание и изменение рецепта: строки связей и учёт по ним."""
+
+    def setUp(self):
+        super().setUp()
+        image = base64.b64encode(image_file().read()).decode()
+        response = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Сварить.', 'cooking_time': 30,
+            'image': f'data:image/png;base64,{image}',
+            'tags': [self.tags[0].pk],
+            'ingredients': self.payload({0: 2, 1: 3, 2: 4}),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.recipe = Recipe.objects.get(pk=response.json()['id'])
+        Cart.objects.create(user=self.author, recipe=self.recipe)
+
+    def payload(self, amounts):
+        return [
+            {'id': self.ingredients[number].pk, 'amount': amount}
+            for number, amount in amounts.items()
+        ]
+
+    def patch(self, data):
+        """Выполняет PATCH рецепта и возвращает число запросов."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries)
+
+    def assert_consistent(self, amounts):
+        expected = {
+            self.ingredients[number].pk: amount
+            for number, amount in amounts.items()
+        }
+        self.assertEqual(self.amounts(self.recipe.pk), expected)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredients_count, len(expected))
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.author).values_list('ingredient', 'amount')), expected)
+        self.assertFalse(any(counters.find_drift().values()))
+        self.assertEqual(shopping_list.find_drift(), {})
+
+    def test_create(self):
+        self.assert_consistent({0: 2, 1: 3, 2: 4})
+        self.assertEqual(
+            list(self.recipe.tags.values_list('pk', flat=True)),
+            [self.tags[0].pk])
+
+    def test_patch_adds_removes_and_changes_amounts(self):
+        self.patch({
+            'ingredients': self.payload({1: 5, 2: 4, 3: 1, 4: 6}),
+            'tags': [self.tags[1].pk],
+        })
+        self.assert_consistent({1: 5, 2: 4, 3: 1, 4: 6})
+        self.assertEqual(
+            list(self.recipe.tags.values_list('pk', flat=True)),
+            [self.tags[1].pk])
+
+    def test_patch_without_changes(self):
+        self.patch({'ingredients': self.payload({0: 2, 1: 3, 2: 4})})
+        self.assert_consistent({0: 2, 1: 3, 2: 4})
+
+    def test_queries_do_not_depend_on_changed_rows(self):
+        # Удаление одной и двух строк, затем добавление одной и трёх,
+        # затем изменение всех количеств.
+        one = self.patch({'ingredients': self.payload({0: 2, 1: 3})})
+        many = self.patch({'ingredients': self.payload({0: 2})})
+        self.assertEqual(one, many)
+        one = self.patch({'ingredients': self.payload({0: 2, 1: 3})})
+        many = self.patch(
+            {'ingredients': self.payload({0: 2, 1: 3, 2: 4, 3: 5, 4: 6})})
+        self.assertEqual(one, many)
+        changed = self.patch(
+            {'ingredients': self.payload({0: 7, 1: 7, 2: 7, 3: 7, 4: 7})})
+        self.assertLessEqual(changed, many)
+        self.assert_consistent({0: 7, 1: 7, 2: 7, 3: 7, 4: 7})
+
+
+class MultipartRecipeTests(RecipeTestCase):
+    """Рецепт в multipart/form-data принимается так же, как в JSON."""
+
+    def post(self, data, path='/api/recipes/', method='post'):
+        return getattr(self.client, method)(
+            path, data, format='multipart')
+
+    def test_create_with_json_array_fields(self):
+        first, second = self.ingredients[:2]
+        response = self.post({
+            'name': 'Омлет', 'text': 'Взбить и пожарить.',
+            'cooking_time': 10, 'image': image_file(),
+            'tags': json.dumps([tag.pk for tag in self.tags]),
+            'ingredients': json.dumps([
+                {'id': first.pk, 'amount': 2},
+                {'id': second.pk, 'amount': 3},
+            ]),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe_id = response.json()['id']
+        self.assertEqual(
+            self.amounts(recipe_id), {first.pk: 2, second.pk: 3})
+        self.assertEqual(
+            {tag['id'] for tag in response.json()['tags']},
+            {tag.pk for tag in self.tags})
+
+    def test_create_with_repeated_fields(self):
+        first, second = self.ingredients[:2]
+        response = self.post({
+            'name': 'Омлет', 'text': 'Взбить и пожарить.',
+            'cooking_time': 10, 'image': image_file(),
+            'tags': [str(tag.pk) for tag in self.tags],
+            'ingredients': [
+                json.dumps({'id': first.pk, 'amount': 2}),
+                json.dumps({'id': second.pk, 'amount': 3}),
+            ],
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            self.amounts(response.json()['id']),
+            {first.pk: 2, second.pk: 3})
+
+    def test_patch_with_image_and_repeated_fields(self):
+        first, second, third = self.ingredients[:3]
+        response = self.post({
+            'name': 'Омлет', 'text': 'Взбить и пожарить.',
+            'cooking_time': 10, 'image': image_file(),
+            'tags': json.dumps([self.tags[0].pk]),
+            'ingredients': json.dumps([{'id': first.pk, 'amount': 2}]),
+        })
+        recipe_id = response.json()['id']
+        image = Recipe.objects.get(pk=recipe_id).image.name
+        response = self.post(
+            {
+                'image': image_file('new.png'),
+                'ingredients': [
+                    json.dumps({'id': second.pk, 'amount': 4}),
+                    json.dumps({'id': third.pk, 'amount': 5}),
+                ],
+            },
+            path=f'/api/recipes/{recipe_id}/', method='patch',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            self.amounts(recipe_id), {second.pk: 4, third.pk: 5})
+        self.assertNotEqual(
+            Recipe.objects.get(pk=recipe_id).image.name, image)
+
+    def test_invalid_json_is_rejected(self):
+        response = self.post({
+            'name': 'Омлет', 'text': 'Взбить и пожарить.',
+            'cooking_time': 10, 'image': image_file(),
+            'tags': json.dumps([self.tags[0].pk]),
+            'ingredients': '{"id": ',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+
+class ShoppingListExportTests(RecipeTestCase):
+    """Выгрузка списка покупок в каждом формате."""
+
+    URL = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients[0].name = 'Мука, пшеничная'
+        cls.ingredients[0].save()
+        recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Пожарить.',
+            cooking_time=20, image='recipes/images/pancakes.png')
+        for ingredient, amount in zip(cls.ingredients[:2], (200, 3)):
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+        Cart.objects.create(user=cls.author, recipe=recipe)
+
+    def download(self, export_format, content_type, filename):
+        response = self.client.get(self.URL, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], content_type)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename={filename}')
+        return b''.join(response.streaming_content)
+
+    def test_txt(self):
+        body = self.download(
+            'txt', 'text/plain; charset=utf-8', 'cart-list.txt')
+        self.assertEqual(body.decode().splitlines(), [
+            'Мука, пшеничная (г) кол-во: 200',
+            'ингредиент 1 (г) кол-во: 3',
+        ])
+
+    def test_csv(self):
+        body = self.download(
+            'csv', 'text/csv; charset=utf-8', 'cart-list.csv')
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        self.assertEqual(rows, [
+            ['Ингредиент', 'Единица измерения', 'Количество'],
+            ['Мука, пшеничная', 'г', '200'],
+            ['ингредиент 1', 'г', '3'],
+        ])
+
+    def test_json(self):
+        body = self.download(
+            'json', 'application/json', 'cart-list.json')
+        self.assertEqual(json.loads(body), [
+            {'name': 'Мука, пшеничная', 'measurement_unit': 'г',
+             'amount': 200},
+            {'name': 'ингредиент 1', 'measurement_unit': 'г', 'amount': 3},
+        ])
+
+    def test_json_empty(self):
+        Cart.objects.filter(user=self.author).delete()
+        body = self.download(
+            'json', 'application/json', 'cart-list.json')
+        self.assertEqual(json.loads(body), [])
+
+    @skipUnless(
+        os.path.exists(settings.SHOPPING_LIST_PDF_FONT),
+        'нет шрифта для PDF',
+    )
+    def test_pdf(self):
+        body = self.download('pdf', 'application/pdf', 'cart-list.pdf')
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertTrue(body.rstrip().endswith(b'%%EOF'))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.URL, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        response = APIClient().get(self.URL)
+        self.assertEqual(response.status_code, 401)
+
+
+class RankedPaginationTests(RecipeTestCase):
+    """Курсорная пагинация не отменяет сортировку по релевантности."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        cls.recipes = []
+        for age, (name, text, numbers) in enumerate((
+            ('Суп', 'Борщ без свёклы не борщ.', (0,)),
+            ('Котлеты', 'Жарить.', (0, 1, 3)),
+            ('Борщ', 'Варить.', (0, 1)),
+        )):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=name, text=text, cooking_time=30,
+                image='recipes/images/recipe.png')
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(days=age))
+            for number in numbers:
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=cls.ingredients[number])
+            cls.recipes.append(recipe)
+        search.update([recipe.pk for recipe in cls.recipes])
+
+    def names(self, **params):
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_cursor_without_ranking(self):
+        self.assertEqual(self.names(), ['Суп', 'Котлеты', 'Борщ'])
+
+    def test_search_keeps_rank(self):
+        self.assertEqual(self.names(search='борщ'), ['Борщ', 'Суп'])
+
+    def test_available_ingredients_keep_rank(self):
+        pantry = f'{self.ingredients[0].pk},{self.ingredients[1].pk}'
+        self.assertEqual(
+            self.names(available_ingredients=pantry),
+            ['Суп', 'Борщ', 'Котлеты'])
+
+    def test_explicit_recent_ordering_uses_cursor(self):
+        response = self.client.get('/api/recipes/', {
+            'pagination': 'cursor', 'search': 'борщ', 'ordering': 'recent',
+            'limit': 1,
+        })
+        self.assertEqual(
+            [recipe['name'] for recipe in response.json()['results']],
+            ['Суп'])
+        self.assertIn('cursor=', response.json()['next'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryCountTests(TestCase):
+    """Число SQL-запросов не зависит от размера страницы и рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(users=20, recipes=150, favorites=10, carts=3,
+                  subscriptions=3, random_seed=1)
+        cls.reader = User.objects.get(
+            pk=Subscribe.objects.values('user').annotate(
+                total=Count('pk')).order_by('-total', 'user').values(
+                'user')[:1])
+
+    def setUp(self):
+        # Кэш ответов для анонимных пользователей скрыл бы запросы.
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_recipe_list_anonymous(self):
+        assert_constant_queries(APIClient(), '/api/recipes/')
+
+    def test_recipe_list(self):
+        assert_constant_queries(self.client, '/api/recipes/')
+
+    def test_recipe_list_filtered(self):
+        for params in (
+            {'is_favorited': 1},
+            {'is_in_shopping_cart': 1},
+            {'tags': 'breakfast'},
+            {'ordering': 'popular'},
+        ):
+            with self.subTest(**params):
+                # Первый запрос заполняет кэш id тегов по slug.
+                count_queries(self.client, '/api/recipes/', **params)
+                assert_constant_queries(
+                    self.client, '/api/recipes/', **params)
+
+    def test_feed(self):
+        assert_constant_queries(self.client, '/api/recipes/feed/')
+
+    def test_subscriptions(self):
+        assert_constant_queries(self.client, '/api/users/subscriptions/')
+        assert_constant_queries(
+            self.client, '/api/users/subscriptions/',
+            param='recipes_limit', values=(1, 10))
+
+    def test_recipe_detail(self):
+        recipes = Recipe.objects.order_by('ingredients_count', 'pk')
+        smallest, largest = recipes.first(), recipes.last()
+        self.assertLess(
+            smallest.ingredients_count, largest.ingredients_count)
+        self.assertEqual(
+            count_queries(self.client, f'/api/recipes/{smallest.pk}/'),
+            count_queries(self.client, f'/api/recipes/{largest.pk}/'),
+        )
+
+
+class QueryPlanTests(TestCase):
+    """Основные запросы API читают таблицы по индексам."""
+
+    def test_query_plans(self):
+        for name, queryset, table, index, seek in get_checks():
+            with self.subTest(name):
+                plan = explain(queryset)
+                problems = find_problems(
+                    plan, table, index, queryset.query.order_by, seek)
+                self.assertEqual(problems, [], plan)
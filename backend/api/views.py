@@ -1,20 +1,34 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Prefetch, Value
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from recipes import timeline, versions
 from recipes.models import (
-    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag
+    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, SimilarRecipe, Tag
 )
+from users.models import Subscribe
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import CreateUpdateRetrieveViewSet
-from .paginators import CustomPagination
+from . import exports
+from .filters import RANKED_FILTERS, IngredientSearchFilter, RecipeFilter
+from .mixins import (
+    AnonymousListCacheMixin, ConditionalGetMixin, CreateUpdateRetrieveViewSet
+)
+from .paginators import (
+    CustomPagination, FeedCursorPagination, RecipeCursorPagination
+)
+from .parsers import MultiPartJSONParser
 from .permissions import AuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from .serializers import (
     IngredientSerializer,
     RecipeSerializer,
@@ -22,29 +36,90 @@ from .serializers import (
     TagSerializer,
 )
 
+User = get_user_model()
 
-class TagViewSet(CreateUpdateRetrieveViewSet):
+
+class TagViewSet(ConditionalGetMixin, CreateUpdateRetrieveViewSet):
     queryset = Tag.objects.all().order_by('slug')
     serializer_class = TagSerializer
+    data_version = versions.TAGS
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    data_version = versions.INGREDIENTS
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientSearchFilter
 
 
-class RecipesViewSet(CreateUpdateRetrieveViewSet):
+class RecipesViewSet(AnonymousListCacheMixin, CreateUpdateRetrieveViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [AuthorOrReadOnly]
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    cache_version = versions.RECIPES
+    parser_classes = [JSONParser, MultiPartJSONParser]
+    multipart_json_fields = ('ingredients', 'tags')
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация включается параметром ?pagination=cursor.
+
+        Она доступна только для сортировки по дате публикации. Поиск и
+        подбор по ингредиентам сортируют по релевантности, которую
+        курсор отбросил бы, поэтому с ними, если ?ordering=recent не
+        задан явно, используется постраничная пагинация.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            cursor = 'cursor' in params or params.get('pagination') == 'cursor'
+            ordering = params.get('ordering')
+            if ordering is None and any(
+                    params.get(name) for name in RANKED_FILTERS):
+                ordering = 'ranked'
+            if (cursor and self.action == 'list'
+                    and (ordering or 'recent') == 'recent'):
+                self._paginator = RecipeCursorPagination()
+        return super().paginator
+
+    def get_queryset(self):
+        user = self.request.user
+        # Поисковый вектор нужен только в условиях запроса.
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredientrecipes',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+        if not user.is_authenticated:
+            return queryset.select_related('author').annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        authors = User.objects.annotate(
+            subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('pk')))
+        )
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors)
+        ).annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
 
     @action(
         detail=True, methods=['POST', 'DELETE'],
@@ -104,22 +179,45 @@ class RecipesViewSet(CreateUpdateRetrieveViewSet):
         recipe.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False)
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Похожие рецепты, посчитанные командой update_similar_recipes."""
+        similar_ids = list(SimilarRecipe.objects.filter(
+            recipe=pk).order_by('-score').values_list('similar', flat=True))
+        if not similar_ids:
+            get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        recipes = self.get_queryset().in_bulk(similar_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in similar_ids
+             if recipe_id in recipes],
+            many=True,
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False, permission_classes=[IsAuthenticated],
+        pagination_class=FeedCursorPagination)
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        page = self.paginate_queryset(
+            timeline.Feed(request.user, self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False, permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PlainTextRenderer, CSVRenderer, JSONRenderer, PDFRenderer
+        ])
     def download_shopping_cart(self, request):
-        ingredient_list = IngredientRecipe.objects.filter(
-            recipe__carts__user=request.user
-        ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount_total=Sum('amount'))
-        to_buy = []
-        for ingredient in ingredient_list:
-            cart_str = (
-                ingredient['ingredient__name'] + ' ('
-                + ingredient['ingredient__measurement_unit'] + ') кол-во: '
-                + str(ingredient['amount_total']) + '\n'
-            )
-            to_buy.append(cart_str)
-        response = HttpResponse(content_type='text/plain')
-        response["Content-Disposition"] = "attachment; filename=cart-list.txt"
-        response.writelines(to_buy)
+        renderer = request.accepted_renderer
+        render, filename = exports.EXPORTS[renderer.format]
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            render(exports.shopping_list_rows(request.user)),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f"attachment; filename={filename}"
         return response
@@ -0,0 +1,162 @@
+"""Замер времени и SQL-запросов каждого запроса.
+
+RequestMetricsMiddleware включается настройкой REQUEST_METRICS_ENABLED.
+Если она выключена, Django исключает middleware из цепочки при старте
+и на запросы оно не влияет.
+
+Для каждого запроса считаются общее время, время в БД, число запросов
+и число повторов одного и того же SQL (признак N+1). Значения уходят
+в заголовок Server-Timing и в лог foodgram.metrics одной JSON-строкой,
+а гистограммы по эндпоинтам отдаются в формате Prometheus на /metrics.
+Гистограммы хранятся в памяти процесса, у каждого воркера gunicorn
+они свои.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger('foodgram.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Registry:
+    """Гистограммы по паре (эндпоинт, метод)."""
+
+    METRICS = (
+        ('foodgram_request_duration_seconds', 'duration', DURATION_BUCKETS),
+        ('foodgram_request_db_seconds', 'db_time', DURATION_BUCKETS),
+        ('foodgram_request_queries', 'queries', QUERY_BUCKETS),
+        ('foodgram_request_duplicate_queries', 'duplicates', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def observe(self, view, method, values):
+        with self.lock:
+            histograms = self.endpoints.get((view, method))
+            if histograms is None:
+                histograms = self.endpoints[(view, method)] = {
+                    key: Histogram(buckets)
+                    for _, key, buckets in self.METRICS
+                }
+            for key, histogram in histograms.items():
+                histogram.observe(values[key])
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, key, _ in self.METRICS:
+                lines.append(f'# TYPE {name} histogram')
+                for (view, method), histograms in sorted(
+                        self.endpoints.items()):
+                    lines.extend(histograms[key].render(
+                        name, f'view="{view}",method="{method}"'))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper, считающая время и повторы запросов."""
+
+    def __init__(self):
+        self.db_time = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.statements[sql] += 1
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return self.queries - len(self.statements)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        values = {
+            'duration': duration,
+            'db_time': recorder.db_time,
+            'queries': recorder.queries,
+            'duplicates': recorder.duplicates,
+        }
+        registry.observe(view, request.method, values)
+        response['Server-Timing'] = (
+            f'total;dur={duration * 1000:.1f}, '
+            f'db;dur={recorder.db_time * 1000:.1f};'
+            f'desc="{recorder.queries} queries, '
+            f'{recorder.duplicates} duplicates"'
+        )
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'db_ms': round(recorder.db_time * 1000, 1),
+            'queries': recorder.queries,
+            'duplicate_queries': recorder.duplicates,
+        }))
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4')
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -109,6 +110,82 @@ else:
     }
 
 
+# Кэш. По умолчанию в памяти процесса; для общего кэша можно указать
+# CACHE_BACKEND=django_redis.cache.RedisCache и
+# CACHE_LOCATION=redis://redis:6379/1 (нужен пакет django-redis).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+# время жизни страниц списка рецептов в кэше для анонимных пользователей
+RECIPE_LIST_CACHE_TIMEOUT = 60 * 5
+
+# до этого количества записей пагинация считает их точно, для больших
+# выборок берётся оценка PostgreSQL или закэшированное значение
+PAGINATION_EXACT_COUNT_THRESHOLD = 1000
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+
+
+# ограничения для загружаемых изображений рецептов: оригинал
+# уменьшается до RECIPE_IMAGE_MAX_SIDE по большей стороне, файлы больше
+# RECIPE_IMAGE_MAX_BYTES и изображения больше RECIPE_IMAGE_MAX_PIXELS
+# отклоняются
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_SIDE = 2560
+RECIPE_IMAGE_MAX_PIXELS = 50_000_000
+
+# число процессов для генерации уменьшенных копий изображений,
+# при 0 копии строятся сразу в процессе, обработавшем запрос
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+
+# ленты подписок: длина ленты пользователя, число подписчиков, начиная
+# с которого рецепты автора не раскладываются по лентам, а читаются при
+# запросе ленты, и число потоков раскладки (при 0 — сразу в запросе)
+TIMELINE_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', default=5000))
+TIMELINE_WORKERS = int(os.getenv('TIMELINE_WORKERS', default=2))
+
+# сколько похожих рецептов хранится для каждого рецепта
+# (команда update_similar_recipes)
+SIMILAR_RECIPES_COUNT = 12
+
+# параметры рейтинга популярности рецептов (команда update_popularity):
+# вес добавления в избранное и в список покупок и период полураспада
+# по возрасту рецепта (от pub_date, а не от даты добавлений)
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 2.0
+POPULARITY_HALF_LIFE_DAYS = 30
+
+# замер времени и SQL-запросов каждого запроса: заголовок Server-Timing,
+# JSON-строки в логе foodgram.metrics и гистограммы на /metrics
+REQUEST_METRICS_ENABLED = bool(os.getenv('REQUEST_METRICS_ENABLED'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -153,6 +230,15 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# максимальное число подсказок при поиске ингредиентов по названию
+INGREDIENT_SEARCH_LIMIT = 50
+
+# шрифт с кириллицей для выгрузки списка покупок в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 # настройки для отправки email в консоль
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
@@ -187,4 +273,4 @@ REST_FRAMEWORK = {
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -6,6 +6,7 @@ from recipes.models import (
     Ingredient,
     IngredientRecipe,
     Recipe,
+    ShoppingListItem,
     Tag,
     TagRecipe,
 )
@@ -57,6 +58,18 @@ class CartAdmin(admin.ModelAdmin):
     list_filter = ("user",)
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "ingredient",
+        "amount",
+    )
+    search_fields = ("user",)
+    empty_value_display = "-пусто-"
+    list_filter = ("user",)
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = (
@@ -95,7 +108,7 @@ class RecipeAdmin(admin.ModelAdmin):
     )
 
     def count_favorite(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     count_favorite.short_description = "Кол-во в избранном"
 
@@ -0,0 +1,52 @@
+"""Подбор рецептов по ингредиентам, которые есть у пользователя.
+
+Вместо реляционного деления по всей таблице IngredientRecipe
+используются две готовые структуры: индекс unique_ingredientrecipe по
+(ingredient_id, recipe_id) служит инвертированным индексом
+«ингредиент — рецепты», а поле Recipe.ingredients_count хранит размер
+набора ингредиентов рецепта и поддерживается сигналами. Запрос читает
+только записи указанных ингредиентов, считает совпадения по каждому
+рецепту и вычитает их из ingredients_count.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import IngredientRecipe
+
+# ограничивает длину списка IN в запросе
+MAX_INGREDIENTS = 200
+
+
+def matched_ingredients(ingredient_ids):
+    return IngredientRecipe.objects.filter(
+        ingredient_id__in=ingredient_ids).order_by().values('recipe')
+
+
+def cookable(queryset, ingredient_ids, max_missing=None):
+    """Рецепты хотя бы с одним из ингредиентов, по числу недостающих.
+
+    Сначала идут рецепты, для которых есть всё, затем те, где не
+    хватает одного ингредиента, и так далее; при равенстве — более
+    новые. Число недостающих доступно в аннотации missing_ingredients.
+    """
+    ingredient_ids = sorted(set(ingredient_ids))
+    if not ingredient_ids:
+        return queryset.none()
+    candidates = matched_ingredients(ingredient_ids)
+    if max_missing is not None:
+        candidates = candidates.annotate(
+            missing=F('recipe__ingredients_count') - Count('*')
+        ).filter(missing__lte=max_missing)
+    # Для каждого кандидата совпадения считаются по тому же индексу:
+    # recipe_id фиксирован, ingredient_id из короткого списка.
+    matched = Subquery(
+        matched_ingredients(ingredient_ids).filter(
+            recipe=OuterRef('pk')
+        ).annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    )
+    return queryset.filter(
+        pk__in=candidates.values('recipe')
+    ).annotate(
+        missing_ingredients=F('ingredients_count') - Coalesce(matched, 0)
+    ).order_by('missing_ingredients', '-pub_date', '-id')
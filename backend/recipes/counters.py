@@ -0,0 +1,61 @@
+"""Денормализованные счётчики избранного, корзин, ингредиентов,
+подписчиков и рецептов.
+
+Счётчики меняются сигналами на F()-выражениях, а функции этого модуля
+позволяют найти и исправить расхождения массовым пересчётом.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe
+
+from .models import Cart, Favorite, IngredientRecipe, Recipe
+
+User = get_user_model()
+
+# (модель, поле счётчика, считаемая модель, поле связи в ней)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', Cart, 'recipe'),
+    (Recipe, 'ingredients_count', IngredientRecipe, 'recipe'),
+    (User, 'followers_count', Subscribe, 'author'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def increment(model, pk, field, amount=1):
+    model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+
+
+def decrement(model, pk, field):
+    model.objects.filter(pk=pk, **{f'{field}__gt': 0}).update(
+        **{field: F(field) - 1})
+
+
+def actual_count(related_model, related_field):
+    """Выражение с фактическим количеством связанных записей."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def find_drift():
+    """Количество записей с неверным значением по каждому счётчику."""
+    return {
+        f'{model._meta.label}.{field}': model.objects.annotate(
+            actual=actual_count(related_model, related_field)
+        ).exclude(**{field: F('actual')}).count()
+        for model, field, related_model, related_field in COUNTERS
+    }
+
+
+def recount():
+    """Пересчитывает все счётчики одним UPDATE на каждый."""
+    for model, field, related_model, related_field in COUNTERS:
+        model.objects.update(
+            **{field: actual_count(related_model, related_field)})
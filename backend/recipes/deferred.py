@@ -0,0 +1,43 @@
+"""Действия после фиксации транзакции, собранные в одно.
+
+Сигналы срабатывают на каждую строку: сохранение рецепта с десятками
+ингредиентов вызывало после фиксации десятки одинаковых обновлений
+поисковых данных и версий. collect() складывает значения в атрибут
+deferred_actions соединения, а первый сработавший после фиксации
+обработчик забирает их и вызывает каждое действие один раз для всех
+собранных значений.
+"""
+import functools
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def flush(connection):
+    pending = getattr(connection, 'deferred_actions', None)
+    if not pending:
+        return
+    connection.deferred_actions = None
+    for action, values in pending.items():
+        action(sorted(values))
+
+
+def collect(action, values, using=DEFAULT_DB_ALIAS):
+    """Вызывает action(values) после фиксации, объединяя вызовы.
+
+    Вне транзакции action вызывается сразу. Обработчик регистрируется
+    при каждом вызове: после отката транзакции или точки сохранения
+    Django его отбрасывает, и собранные значения дожидаются следующей
+    фиксации. Действия пересчитывают данные по текущему состоянию базы,
+    поэтому оставшиеся после отката значения безвредны.
+    """
+    values = set(values)
+    if not values:
+        return
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        action(sorted(values))
+        return
+    if getattr(connection, 'deferred_actions', None) is None:
+        connection.deferred_actions = {}
+    connection.deferred_actions.setdefault(action, set()).update(values)
+    transaction.on_commit(functools.partial(flush, connection), using)
@@ -0,0 +1,108 @@
+"""Индекс названий ингредиентов в памяти процесса.
+
+Индекс строится из таблицы Ingredient и не изменяется. Вместе с ним
+хранится версия набора versions.INGREDIENTS, на которой он построен:
+версия общая для всех процессов, и при каждом поиске индекс, отставший
+от неё, собирается заново. Поэтому изменение ингредиентов в одном
+процессе не оставляет устаревший индекс в остальных.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from . import versions
+from .models import Ingredient
+
+NGRAM_SIZE = 3
+
+_index = None
+_lock = threading.Lock()
+
+
+def ngrams(text):
+    """Все подстроки длиной от 1 до NGRAM_SIZE символов."""
+    return {
+        text[start:start + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for start in range(len(text) - size + 1)
+    }
+
+
+class IngredientIndex:
+    """Отсортированный список названий и n-граммный индекс по ним."""
+
+    def __init__(self, rows, version=0):
+        self.version = version
+        entries = sorted((name.lower(), pk) for pk, name in rows)
+        self.names = tuple(name for name, _ in entries)
+        self.ids = tuple(pk for _, pk in entries)
+        postings = defaultdict(list)
+        for position, name in enumerate(self.names):
+            for gram in ngrams(name):
+                postings[gram].append(position)
+        self.postings = {
+            gram: tuple(positions) for gram, positions in postings.items()
+        }
+
+    def candidates(self, query):
+        """Позиции названий, которые могут содержать query.
+
+        Для коротких запросов это точный список, для длинных - список
+        по самой редкой из n-грамм запроса.
+        """
+        if len(query) <= NGRAM_SIZE:
+            return self.postings.get(query, ())
+        return min(
+            (self.postings.get(gram, ()) for gram in ngrams(query)
+             if len(gram) == NGRAM_SIZE),
+            key=len,
+        )
+
+    def search(self, query, limit):
+        """id ингредиентов: сначала совпадения по началу, затем по вхождению.
+
+        Внутри каждой группы результаты отсортированы по названию.
+        """
+        query = query.strip().lower()
+        if not query or limit < 1:
+            return []
+        start = end = bisect_left(self.names, query)
+        while end < len(self.names) and self.names[end].startswith(query):
+            end += 1
+        result = list(self.ids[start:min(end, start + limit)])
+        for position in self.candidates(query):
+            if len(result) >= limit:
+                break
+            if start <= position < end:
+                continue
+            if query in self.names[position]:
+                result.append(self.ids[position])
+        return result
+
+
+def get_index():
+    """Индекс, построенный на текущей версии ингредиентов."""
+    global _index
+    version = versions.get(versions.INGREDIENTS)[0]
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                # Версия читается до строк: если ингредиенты изменятся
+                # во время сборки, следующий поиск соберёт индекс снова.
+                _index = IngredientIndex(
+                    Ingredient.objects.values_list('id', 'name').iterator(),
+                    version,
+                )
+            index = _index
+    return index
+
+
+def invalidate():
+    """Сбрасывает индекс текущего процесса, не дожидаясь смены версии."""
+    global _index
+    _index = None
+
+
+def search(query, limit):
+    return get_index().search(query, limit)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает списки покупок с нуля и сообщает о расхождениях '
+        'с сохранёнными данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Перестроить списки пользователей с расхождениями.',
+        )
+
+    def handle(self, *args, **options):
+        drift = shopping_list.find_drift()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено.'))
+            return
+        for user_id, rows in sorted(drift.items()):
+            self.stdout.write(
+                f'Пользователь {user_id}: расхождений {len(rows)}')
+            if options['verbosity'] > 1:
+                for ingredient_id, stored, expected in rows:
+                    self.stdout.write(
+                        f'  ингредиент {ingredient_id}: сохранено {stored}, '
+                        f'ожидается {expected}')
+        if options['fix']:
+            shopping_list.refresh(drift)
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок перестроены для {len(drift)} пользователей.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Найдены расхождения у {len(drift)} пользователей.'))
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes import thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений рецептов, для которых их '
+        'ещё нет, например после переноса базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить копии для всех рецептов.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS or 1,
+            help='Количество процессов.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(has_thumbnails=False)
+        names = set(recipes.values_list('image', flat=True))
+        ready = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(thumbnails.generate, name): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                try:
+                    ready.append(future.result())
+                except Exception as error:
+                    self.stderr.write(f'{futures[future]}: {error}')
+        thumbnails.mark_ready(ready)
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии построены для {len(ready)} из {len(names)} изображений '
+            f'за {time.monotonic() - started:.1f} с.'))
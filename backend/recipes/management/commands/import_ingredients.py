@@ -0,0 +1,108 @@
+import csv
+import json
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import ingredient_index, versions
+from recipes.models import Ingredient
+
+READ_SIZE = 1 << 16
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json(stream):
+    """Поэлементно читает JSON-массив, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив.')
+    position = 1
+    eof = False
+    number = 0
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON.')
+            chunk = stream.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        number += 1
+        # Поддерживается и формат фикстуры dumpdata.
+        if isinstance(item, dict):
+            item = item.get('fields', item)
+        try:
+            name = item['name'].strip()
+            measurement_unit = item['measurement_unit'].strip()
+        except (AttributeError, KeyError, TypeError):
+            raise CommandError(
+                f'Элемент {number}: ожидаются строковые поля name '
+                f'и measurement_unit.')
+        yield name, measurement_unit
+
+
+def iter_csv(stream):
+    reader = csv.reader(stream)
+    for row in reader:
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        if len(row) < 2:
+            raise CommandError(
+                f'Строка {reader.line_num}: ожидаются название и единица '
+                f'измерения через запятую.')
+        yield row[0].strip(), row[1].strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON порциями. Уже существующие '
+        'пары (название, единица измерения) пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .csv или .json файлу.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        readers = {'.csv': iter_csv, '.json': iter_json}
+        if path.suffix not in readers:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        processed = 0
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            rows = readers[path.suffix](stream)
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                Ingredient.objects.bulk_create(
+                    (Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in dict.fromkeys(chunk)),
+                    ignore_conflicts=True,
+                )
+                processed += len(chunk)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано строк: {processed}')
+        created = Ingredient.objects.count() - before
+        ingredient_index.invalidate()
+        versions.bump(versions.INGREDIENTS)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {processed} строк, добавлено {created} ингредиентов '
+            f'за {elapsed:.1f} с ({processed / max(elapsed, 1e-6):.0f} '
+            f'строк/с).'))
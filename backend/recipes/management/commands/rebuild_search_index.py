@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает поисковые данные всех рецептов, например после '
+        'массовой загрузки или изменения словаря.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс перестроен за '
+            f'{time.monotonic() - started:.1f} с.'))
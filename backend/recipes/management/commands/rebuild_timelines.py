@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит ленты подписок заново. Нужна после изменения '
+        'TIMELINE_FANOUT_LIMIT или TIMELINE_LENGTH и после перезапуска '
+        'с незавершённой раскладкой рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, можно указать несколько раз.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        if options['users']:
+            users = users.filter(pk__in=options['users'])
+        user_ids = list(users)
+        chunk_size = options['chunk_size']
+        for start in range(0, len(user_ids), chunk_size):
+            timeline.rebuild(user_ids[start:start + chunk_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты перестроены: {len(user_ids)}.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет счётчики избранного, корзин, подписчиков и рецептов '
+        'и пересчитывает их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.find_drift()
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: расхождений {rows}')
+        if options['dry_run']:
+            return
+        counters.recount()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
@@ -0,0 +1,101 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import seed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт детерминированный набор пользователей, рецептов, '
+        'избранного, корзин и подписок для нагрузочных проверок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Количество пользователей.',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Количество рецептов.',
+        )
+        parser.add_argument(
+            '--authors-share', type=float, default=0.1,
+            help='Доля пользователей, публикующих рецепты.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='Среднее число рецептов в корзине пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=5,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора случайных чисел.',
+        )
+        parser.add_argument(
+            '--prefix', default=seed.PREFIX,
+            help='Префикс логинов и названий создаваемых записей.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество записей в одном INSERT.',
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Удалить ранее созданный набор с тем же префиксом.',
+        )
+        parser.add_argument(
+            '--summary',
+            help='Записать сводку по набору в JSON-файл.',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        started = time.monotonic()
+        if options['flush']:
+            deleted = seed.flush(prefix)
+            self.stdout.write(f'Удалено записей: {deleted}')
+        elif User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Набор с префиксом {prefix} уже есть, '
+                'используйте --flush или другой --prefix.')
+        if options['users'] < 1 or options['recipes'] < 1:
+            return
+        summary = seed.seed(
+            users=options['users'],
+            recipes=options['recipes'],
+            authors_share=options['authors_share'],
+            favorites=options['favorites'],
+            carts=options['carts'],
+            subscriptions=options['subscriptions'],
+            random_seed=options['seed'],
+            prefix=prefix,
+            chunk_size=options['chunk_size'],
+            progress=self.progress if options['verbosity'] else None,
+        )
+        if options['summary']:
+            with open(options['summary'], 'w', encoding='utf-8') as file:
+                json.dump(summary, file)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(summary["user_ids"])}, '
+            f'рецептов: {len(summary["recipe_ids"])}, '
+            f'избранного: {summary["favorites"]}, '
+            f'корзин: {summary["carts"]}, '
+            f'подписок: {summary["subscriptions"]} '
+            f'за {time.monotonic() - started:.1f} с. '
+            f'Пароль пользователей: {summary["password"]}'))
+
+    def progress(self, stage, done, total):
+        self.stdout.write(f'{stage}: {done}/{total}')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import similar
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты для /api/recipes/{id}/similar/. '
+        'Запускайте периодически, например по cron; без --full '
+        'обрабатываются только рецепты, изменённые после прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = similar.update(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {total} рецептов '
+            f'за {time.monotonic() - started:.1f} с.'))
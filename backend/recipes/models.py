@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -20,6 +21,11 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("name", "measurement_unit"), name="unique_ingredient"
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -65,11 +71,13 @@ class Tag(models.Model):
 class Recipe(models.Model):
     """Класс описывающий модель рецепта."""
 
+    # индекс по author_id даёт recipe_author_pub_date_idx
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         null=True,
         related_name="recipes",
+        db_index=False,
         verbose_name="Автор",
     )
     name = models.CharField(
@@ -107,11 +115,63 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name="Дата публикации",
     )
+    # по нему команда update_similar_recipes находит изменённые рецепты
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество добавлений в избранное",
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество добавлений в список покупок",
+    )
+    ingredients_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество ингредиентов",
+    )
+    popularity = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name="Популярность",
+    )
+    has_thumbnails = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Уменьшенные копии изображения готовы",
+    )
+    # заполняется на PostgreSQL, см. recipes.search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
 
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(
+                fields=("-pub_date", "-id"), name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=("-popularity", "-id"), name="recipe_popularity_idx"
+            ),
+            models.Index(
+                fields=("cooking_time", "-pub_date", "-id"),
+                name="recipe_cooking_time_idx",
+            ),
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="recipe_author_pub_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -120,9 +180,11 @@ class Recipe(models.Model):
 class TagRecipe(models.Model):
     """Класс описывающий модель связи Рецепта с Тэгом."""
 
+    # индекс по tag_id даёт ограничение unique_tagrecipe
     tag = models.ForeignKey(
         Tag,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Тег",
     )
     recipe = models.ForeignKey(
@@ -147,10 +209,12 @@ class TagRecipe(models.Model):
 class IngredientRecipe(models.Model):
     """Класс описывающий модель связи Ингредиентов в рецепте"""
 
+    # индекс по ingredient_id даёт ограничение unique_ingredientrecipe
     ingredient = models.ForeignKey(
         Ingredient,
         on_delete=models.CASCADE,
         related_name="ingredientrecipes",
+        db_index=False,
         verbose_name="Ингредиент в рецепте",
     )
     recipe = models.ForeignKey(
@@ -185,9 +249,10 @@ class IngredientRecipe(models.Model):
 class Cart(models.Model):
     """Класс описывающий модель корзины для покупок."""
 
+    # индекс по user_id даёт ограничение unique_cart
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name="Пользователь",
-        related_name="carts",
+        related_name="carts", db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -210,10 +275,12 @@ class Cart(models.Model):
 
 
 class Favorite(models.Model):
+    # индекс по user_id даёт ограничение unique_favorite
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="favorite",
+        db_index=False,
         verbose_name="Пользователь",
     )
     recipe = models.ForeignKey(
@@ -234,3 +301,142 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user} id - {self.user.pk}, {self.recipe}"
+
+
+class ShoppingListItem(models.Model):
+    """Класс описывающий строку итогового списка покупок пользователя."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ID")
+    # индекс по user_id даёт ограничение unique_shoppinglistitem
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        db_index=False,
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name="Количество ингредиента",
+    )
+
+    class Meta:
+        verbose_name = "Строка списка покупок"
+        verbose_name_plural = "Строки списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="unique_shoppinglistitem"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.ingredient} {self.amount}"
+
+
+class TimelineEntry(models.Model):
+    """Класс описывающий рецепт в ленте подписок пользователя."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ID")
+    # индекс по user_id даёт ограничение unique_timelineentry
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        db_index=False,
+        verbose_name="Пользователь",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Рецепт",
+    )
+    # копия Recipe.pub_date, чтобы лента читалась по одному индексу
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации рецепта",
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_timelineentry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("user", "-pub_date", "-recipe"),
+                name="timeline_user_pub_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.recipe}"
+
+
+class SimilarRecipe(models.Model):
+    """Класс описывающий рецепт из списка похожих на данный."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ID")
+    # индекс по recipe_id даёт similar_recipe_score_idx
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_recipes",
+        db_index=False,
+        verbose_name="Рецепт",
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_to",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField(
+        verbose_name="Сходство",
+    )
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        indexes = [
+            models.Index(
+                fields=("recipe", "-score"),
+                name="similar_recipe_score_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} {self.similar} {self.score:.3f}"
+
+
+class DataVersion(models.Model):
+    """Класс описывающий версию набора данных для проверки кэша."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ID")
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Набор данных",
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Версия",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,143 @@
+"""Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+На PostgreSQL поиск идёт по полю Recipe.search_vector (tsvector с
+русской морфологией и GIN-индексом), на SQLite — по FTS5-таблице
+recipes_recipe_fts, чтобы поиск работал и при локальной разработке.
+Поле и таблица создаются миграцией 0011 и обновляются сигналами;
+массовые операции вызывают update или rebuild явно.
+"""
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection
+from django.db.models import (
+    F, FloatField, OuterRef, Q, Subquery, TextField, Value
+)
+from django.db.models.expressions import RawSQL
+
+from . import deferred
+from .models import IngredientRecipe, Recipe
+
+CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# веса названия, ингредиентов и описания для bm25 в SQLite
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+CHUNK_SIZE = 500
+TERM = re.compile(r'\w+')
+
+
+def search_vector():
+    ingredients = Subquery(
+        IngredientRecipe.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names'),
+        output_field=TextField(),
+    )
+    return (
+        SearchVector('name', config=CONFIG, weight='A')
+        + SearchVector(ingredients, config=CONFIG, weight='B')
+        + SearchVector('text', config=CONFIG, weight='C')
+    )
+
+
+def fold(sql):
+    # unicode61 в SQLite не приравнивает «ё» к «е».
+    return f"replace(replace({sql}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fts_update(recipe_ids):
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    ingredients = (
+        "COALESCE((SELECT group_concat(ingredient.name, ' ')"
+        ' FROM recipes_ingredientrecipe link'
+        ' JOIN recipes_ingredient ingredient'
+        ' ON ingredient.id = link.ingredient_id'
+        " WHERE link.recipe_id = recipe.id), '')"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT recipe.id, {fold("recipe.name")}, '
+            f'{fold(ingredients)}, {fold("recipe.text")} '
+            f'FROM recipes_recipe recipe WHERE recipe.id IN ({placeholders})',
+            recipe_ids)
+
+
+def update(recipe_ids):
+    """Перестраивает поисковые данные указанных рецептов."""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        if connection.vendor == 'postgresql':
+            Recipe.objects.filter(pk__in=chunk).update(
+                search_vector=search_vector())
+        elif connection.vendor == 'sqlite':
+            fts_update(chunk)
+
+
+def update_on_commit(recipe_ids):
+    """Обновляет рецепты после фиксации, каждый один раз за транзакцию."""
+    deferred.collect(update, recipe_ids)
+
+
+def remove(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids)
+
+
+def rebuild():
+    update(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def fts_query(query):
+    """Строка запроса FTS5: все слова, каждое как префикс."""
+    terms = TERM.findall(query.lower().replace('ё', 'е'))
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(queryset, query):
+    """Фильтрует queryset по запросу и сортирует по релевантности.
+
+    Релевантность доступна в аннотации search_rank, поэтому результат
+    можно дальше фильтровать и пересортировать.
+    """
+    ordering = ('-search_rank', '-pub_date', '-id')
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by(*ordering)
+    if connection.vendor == 'sqlite':
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        table = Recipe._meta.db_table
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,), output_field=FloatField(),
+        )).order_by(*ordering)
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+        | Q(ingredients__name__icontains=query)
+    ).distinct().annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).order_by(*ordering)
@@ -0,0 +1,324 @@
+"""Генерация детерминированного набора данных для нагрузочных проверок.
+
+Набор строится генератором random.Random с фиксированным зерном: при
+одинаковых параметрах и одинаковых справочниках тегов и ингредиентов
+получаются одни и те же пользователи, рецепты, избранное, корзины и
+подписки. Авторы и рецепты выбираются по закону Ципфа, поэтому есть
+и авторы с большим числом рецептов, и популярные рецепты.
+
+Записи создаются порциями через bulk_create, сигналы при этом не
+срабатывают, поэтому в конце счётчики, списки покупок, рейтинг и
+версии данных пересчитываются явно.
+"""
+import base64
+import io
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import Subscribe
+
+from . import (
+    counters, ingredient_index, search, shopping_list, signals, timeline,
+    versions
+)
+from .models import (
+    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingListItem,
+    SimilarRecipe, Tag, TagRecipe, TimelineEntry
+)
+
+User = get_user_model()
+
+PREFIX = 'seed'
+PASSWORD = 'seed-password'
+IMAGE = 'recipes/images/seed.png'
+# Прозрачный PNG 1x1.
+IMAGE_CONTENT = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk'
+    '+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+DEFAULT_TAGS = (
+    ('Завтрак', Tag.YELLOW, 'breakfast'),
+    ('Обед', Tag.RED, 'lunch'),
+    ('Ужин', Tag.GREEN, 'dinner'),
+)
+MIN_INGREDIENTS = 100
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+PUB_DATE_SPREAD = timedelta(days=365)
+
+
+def zipf_weights(size):
+    return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def pick(rng, population, cum_weights, count, exclude=None):
+    """Выбирает до count различных элементов с учётом весов."""
+    if not population:
+        return []
+    chosen = set(rng.choices(population, cum_weights=cum_weights, k=count))
+    chosen.discard(exclude)
+    return sorted(chosen)
+
+
+def ensure_tags():
+    """Возвращает id тегов, создавая стандартные, если тегов нет."""
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in DEFAULT_TAGS
+        )
+        versions.bump(versions.TAGS)
+    return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+
+def ensure_ingredients(prefix):
+    """Возвращает id ингредиентов, дополняя справочник до минимума."""
+    missing = MIN_INGREDIENTS - Ingredient.objects.count()
+    if missing > 0:
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{prefix} ингредиент {number}',
+                    measurement_unit=UNITS[number % len(UNITS)],
+                )
+                for number in range(missing)
+            ),
+            ignore_conflicts=True,
+        )
+        ingredient_index.invalidate()
+        versions.bump(versions.INGREDIENTS)
+    return list(
+        Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+
+def ensure_image():
+    if not default_storage.exists(IMAGE):
+        default_storage.save(IMAGE, ContentFile(IMAGE_CONTENT))
+    return IMAGE
+
+
+def create_users(count, prefix, chunk_size, progress):
+    password = make_password(PASSWORD)
+    user_ids = []
+    for numbers in chunked(range(count), chunk_size):
+        usernames = [f'{prefix}{number:07d}' for number in numbers]
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    first_name='Пользователь',
+                    last_name=username,
+                    password=password,
+                )
+                for username in usernames
+            )
+        user_ids.extend(User.objects.filter(
+            username__in=usernames).order_by('id').values_list(
+                'id', flat=True))
+        progress('users', len(user_ids), count)
+    return user_ids
+
+
+def make_recipe(rng, number, prefix, authors, author_weights, tag_ids,
+                ingredient_ids, image, now):
+    """Генерирует рецепт вместе с тегами и ингредиентами.
+
+    Все случайные значения рецепта выбираются подряд, поэтому результат
+    не зависит от размера порции.
+    """
+    recipe = Recipe(
+        author_id=rng.choices(authors, cum_weights=author_weights)[0],
+        name=f'{prefix} рецепт {number}',
+        text=f'Описание рецепта {number}.',
+        image=image,
+        cooking_time=rng.randint(5, 180),
+    )
+    pub_date = now - PUB_DATE_SPREAD * rng.random()
+    tags = rng.sample(tag_ids, rng.randint(1, min(2, len(tag_ids))))
+    ingredients = [
+        (ingredient_id, rng.randint(1, 500))
+        for ingredient_id in rng.sample(ingredient_ids, rng.randint(3, 10))
+    ]
+    return recipe, pub_date, tags, ingredients
+
+
+def create_recipes(rng, count, prefix, authors, tag_ids, ingredient_ids,
+                   chunk_size, progress):
+    author_weights = zipf_weights(len(authors))
+    image = ensure_image()
+    now = timezone.now()
+    recipe_ids = []
+    for numbers in chunked(range(count), chunk_size):
+        rows = [
+            make_recipe(rng, number, prefix, authors, author_weights,
+                        tag_ids, ingredient_ids, image, now)
+            for number in numbers
+        ]
+        recipes = [recipe for recipe, *_ in rows]
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            ids = dict(Recipe.objects.filter(
+                name__in=[recipe.name for recipe in recipes]
+            ).values_list('name', 'id'))
+            # pub_date с auto_now_add при вставке всегда получает текущее
+            # время, поэтому даты публикации проставляются отдельно.
+            for recipe, pub_date, _, _ in rows:
+                recipe.pk = ids[recipe.name]
+                recipe.pub_date = pub_date
+            Recipe.objects.bulk_update(recipes, ['pub_date'])
+            TagRecipe.objects.bulk_create(
+                TagRecipe(tag_id=tag_id, recipe_id=recipe.pk)
+                for recipe, _, tags, _ in rows
+                for tag_id in tags
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    ingredient_id=ingredient_id,
+                    recipe_id=recipe.pk,
+                    amount=amount,
+                )
+                for recipe, _, _, ingredients in rows
+                for ingredient_id, amount in ingredients
+            )
+        recipe_ids.extend(recipe.pk for recipe in recipes)
+        progress('recipes', len(recipe_ids), count)
+    return recipe_ids
+
+
+def create_edges(rng, user_ids, authors, recipe_ids, per_user, chunk_size,
+                 progress):
+    """Создаёт избранное, корзины и подписки для каждого пользователя."""
+    recipe_pool = rng.sample(recipe_ids, len(recipe_ids))
+    recipe_weights = zipf_weights(len(recipe_pool))
+    author_weights = zipf_weights(len(authors))
+    totals = {Favorite: 0, Cart: 0, Subscribe: 0}
+    done = 0
+    for users in chunked(user_ids, chunk_size):
+        rows = {Favorite: [], Cart: [], Subscribe: []}
+        for user_id in users:
+            rows[Favorite].extend(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in pick(
+                    rng, recipe_pool, recipe_weights,
+                    rng.randint(0, 2 * per_user['favorites']))
+            )
+            rows[Cart].extend(
+                Cart(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in pick(
+                    rng, recipe_pool, recipe_weights,
+                    rng.randint(0, 2 * per_user['carts']))
+            )
+            rows[Subscribe].extend(
+                Subscribe(user_id=user_id, author_id=author_id)
+                for author_id in pick(
+                    rng, authors, author_weights,
+                    rng.randint(0, 2 * per_user['subscriptions']),
+                    exclude=user_id)
+            )
+        with transaction.atomic():
+            for model, objects in rows.items():
+                model.objects.bulk_create(objects, batch_size=chunk_size)
+                totals[model] += len(objects)
+        done += len(users)
+        progress('edges', done, len(user_ids))
+    return totals
+
+
+def refresh_derived(user_ids, recipe_ids, chunk_size):
+    """Пересчитывает данные, которые обычно поддерживают сигналы."""
+    counters.recount()
+    for users in chunked(user_ids, chunk_size):
+        shopping_list.refresh(users)
+        timeline.rebuild(users)
+    search.update(recipe_ids)
+    call_command('update_popularity', stdout=io.StringIO())
+    versions.bump(versions.RECIPES)
+
+
+def seed(users=100, recipes=1000, authors_share=0.1, favorites=20, carts=3,
+         subscriptions=5, random_seed=0, prefix=PREFIX, chunk_size=1000,
+         progress=None):
+    """Создаёт набор данных и возвращает сводку по нему.
+
+    favorites, carts и subscriptions задают среднее число записей на
+    пользователя. Все пользователи получают пароль PASSWORD.
+    """
+    progress = progress or (lambda stage, done, total: None)
+    rng = random.Random(random_seed)
+    tag_ids = ensure_tags()
+    ingredient_ids = ensure_ingredients(prefix)
+    user_ids = create_users(users, prefix, chunk_size, progress)
+    authors = user_ids[:max(1, int(len(user_ids) * authors_share))]
+    recipe_ids = create_recipes(
+        rng, recipes, prefix, authors, tag_ids, ingredient_ids, chunk_size,
+        progress)
+    totals = create_edges(
+        rng, user_ids, authors, recipe_ids,
+        {'favorites': favorites, 'carts': carts,
+         'subscriptions': subscriptions},
+        chunk_size, progress)
+    refresh_derived(user_ids, recipe_ids, chunk_size)
+    return {
+        'prefix': prefix,
+        'password': PASSWORD,
+        'user_ids': user_ids,
+        'author_ids': authors,
+        'recipe_ids': recipe_ids,
+        'favorites': totals[Favorite],
+        'carts': totals[Cart],
+        'subscriptions': totals[Subscribe],
+    }
+
+
+def flush(prefix=PREFIX):
+    """Удаляет пользователей набора вместе со всеми их данными.
+
+    Обработчики сигналов на время удаления отключаются, а производные
+    данные затем пересчитываются один раз.
+    """
+    users = User.objects.filter(
+        username__startswith=prefix, email__endswith='@example.com')
+    recipes = Recipe.objects.filter(author__in=users)
+    carts = Cart.objects.filter(recipe__in=recipes).exclude(user__in=users)
+    affected = set(carts.values_list('user_id', flat=True))
+    recipe_ids = list(recipes.values_list('pk', flat=True))
+    querysets = (
+        ShoppingListItem.objects.filter(user__in=users),
+        TimelineEntry.objects.filter(
+            Q(user__in=users) | Q(recipe__in=recipes)),
+        SimilarRecipe.objects.filter(
+            Q(recipe__in=recipes) | Q(similar__in=recipes)),
+        Cart.objects.filter(Q(user__in=users) | Q(recipe__in=recipes)),
+        Favorite.objects.filter(Q(user__in=users) | Q(recipe__in=recipes)),
+        Subscribe.objects.filter(Q(user__in=users) | Q(author__in=users)),
+        TagRecipe.objects.filter(recipe__in=recipes),
+        IngredientRecipe.objects.filter(recipe__in=recipes),
+        recipes,
+    )
+    with transaction.atomic(), signals.bulk():
+        deleted = sum(queryset.delete()[0] for queryset in querysets)
+        deleted += users.delete()[0]
+        deleted += Ingredient.objects.filter(
+            name__startswith=f'{prefix} ингредиент ').delete()[0]
+        counters.recount()
+        shopping_list.refresh(affected)
+        search.remove(recipe_ids)
+    ingredient_index.invalidate()
+    for name in (versions.INGREDIENTS, versions.RECIPES):
+        versions.bump(name)
+    return deleted
@@ -0,0 +1,85 @@
+"""Поддержка материализованного списка покупок пользователей.
+
+Строки ShoppingListItem хранят суммарное количество каждого ингредиента
+по всем рецептам в корзине пользователя. Пересчёт выполняется точечно:
+только для затронутых пользователей и ингредиентов.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Cart, IngredientRecipe, ShoppingListItem
+
+User = get_user_model()
+
+
+def calculate(user_ids=None, ingredient_ids=None):
+    """Возвращает ожидаемые суммы в виде {(user_id, ingredient_id): amount}."""
+    if user_ids is None:
+        rows = IngredientRecipe.objects.filter(recipe__carts__isnull=False)
+    else:
+        rows = IngredientRecipe.objects.filter(
+            recipe__carts__user__in=user_ids)
+    if ingredient_ids is not None:
+        rows = rows.filter(ingredient__in=ingredient_ids)
+    rows = rows.values_list('recipe__carts__user', 'ingredient').annotate(
+        total=Sum('amount')
+    ).order_by()
+    return {(user, ingredient): total for user, ingredient, total in rows}
+
+
+def refresh(user_ids, ingredient_ids=None):
+    """Пересчитывает строки списка покупок для пользователей и ингредиентов.
+
+    Если ingredient_ids не передан, список пользователей строится заново.
+    Строки пользователей блокируются до конца транзакции, а суммы
+    считаются уже под блокировкой: параллельный пересчёт тех же списков
+    ждёт и не может ни затереть результат устаревшими суммами, ни
+    вставить те же строки повторно.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with transaction.atomic():
+        # Блокировки берутся по порядку pk, чтобы не было взаимных.
+        user_ids = list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        items = ShoppingListItem.objects.filter(user__in=user_ids)
+        if ingredient_ids is not None:
+            items = items.filter(ingredient__in=ingredient_ids)
+        totals = calculate(user_ids, ingredient_ids)
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+            for (user_id, ingredient_id), amount in totals.items()
+        )
+
+
+def refresh_recipe(recipe, ingredient_ids):
+    """Обновляет списки всех пользователей, у которых рецепт в корзине."""
+    user_ids = Cart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True)
+    refresh(user_ids, ingredient_ids)
+
+
+def find_drift():
+    """Сравнивает сохранённые списки с пересчитанными с нуля.
+
+    Возвращает {user_id: [(ingredient_id, сохранено, ожидается), ...]}.
+    """
+    expected = calculate()
+    stored = {
+        (user, ingredient): amount
+        for user, ingredient, amount in ShoppingListItem.objects.values_list(
+            'user', 'ingredient', 'amount').iterator()
+    }
+    drift = defaultdict(list)
+    for key in expected.keys() | stored.keys():
+        if expected.get(key) != stored.get(key):
+            user_id, ingredient_id = key
+            drift[user_id].append(
+                (ingredient_id, stored.get(key), expected.get(key)))
+    return dict(drift)
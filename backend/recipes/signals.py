@@ -0,0 +1,234 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from users.models import Subscribe
+
+from . import (
+    counters, ingredient_index, search, shopping_list, thumbnails, timeline,
+    versions
+)
+from .models import (
+    Cart, Favorite, Ingredient, IngredientRecipe, Recipe, Tag, TagRecipe
+)
+
+User = get_user_model()
+
+_local = threading.local()
+
+
+@contextmanager
+def bulk():
+    """Отключает обработчики этого модуля внутри блока.
+
+    Для массовых изменений, после которых вызывающий код сам один раз
+    пересчитывает счётчики, списки покупок, версии и поисковые данные:
+    стандартный delete() вызывает сигналы для каждой строки.
+    """
+    previous = getattr(_local, 'bulk', False)
+    _local.bulk = True
+    try:
+        yield
+    finally:
+        _local.bulk = previous
+
+
+def per_row(handler):
+    """Обработчик сигнала, который пропускается внутри bulk()."""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not getattr(_local, 'bulk', False):
+            handler(*args, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=Cart)
+@per_row
+def cart_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(Recipe, instance.recipe_id, 'carts_count')
+        shopping_list.refresh(
+            [instance.user_id],
+            IngredientRecipe.objects.filter(
+                recipe_id=instance.recipe_id).values('ingredient_id'),
+        )
+
+
+@receiver(pre_delete, sender=Cart)
+@per_row
+def cart_remember_ingredients(sender, instance, **kwargs):
+    # При каскадном удалении рецепта его ингредиенты могут исчезнуть
+    # раньше корзины, поэтому запоминаем их до удаления.
+    instance.ingredient_ids = list(IngredientRecipe.objects.filter(
+        recipe_id=instance.recipe_id).values_list('ingredient_id', flat=True))
+
+
+@receiver(post_delete, sender=Cart)
+@per_row
+def cart_deleted(sender, instance, **kwargs):
+    counters.decrement(Recipe, instance.recipe_id, 'carts_count')
+    shopping_list.refresh(
+        [instance.user_id], getattr(instance, 'ingredient_ids', None))
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@per_row
+def ingredient_recipe_changed(sender, instance, **kwargs):
+    shopping_list.refresh_recipe(
+        instance.recipe_id, [instance.ingredient_id])
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@per_row
+def ingredient_recipe_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(Recipe, instance.recipe_id, 'ingredients_count')
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+@per_row
+def ingredient_recipe_deleted(sender, instance, **kwargs):
+    counters.decrement(Recipe, instance.recipe_id, 'ingredients_count')
+
+
+@receiver(post_save, sender=Favorite)
+@per_row
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(Recipe, instance.recipe_id, 'favorites_count')
+
+
+@receiver(post_delete, sender=Favorite)
+@per_row
+def favorite_deleted(sender, instance, **kwargs):
+    counters.decrement(Recipe, instance.recipe_id, 'favorites_count')
+
+
+@receiver(post_save, sender=Recipe)
+@per_row
+def recipe_created(sender, instance, created, **kwargs):
+    if created and instance.author_id:
+        counters.increment(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+@per_row
+def recipe_published(sender, instance, created, **kwargs):
+    if created and instance.author_id:
+        timeline.schedule_on_commit(instance.pk)
+
+
+@receiver(pre_save, sender=Recipe)
+@per_row
+def recipe_image_changed(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    image = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True).first()
+    if image != instance.image.name:
+        instance.has_thumbnails = False
+
+
+@receiver(post_save, sender=Recipe)
+@per_row
+def recipe_image_saved(sender, instance, **kwargs):
+    if instance.image and not instance.has_thumbnails:
+        thumbnails.schedule_on_commit(instance.image.name)
+
+
+@receiver(post_delete, sender=Recipe)
+@per_row
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.author_id:
+        counters.decrement(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Subscribe)
+@per_row
+def subscribe_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(User, instance.author_id, 'followers_count')
+
+
+@receiver(post_delete, sender=Subscribe)
+@per_row
+def subscribe_deleted(sender, instance, **kwargs):
+    counters.decrement(User, instance.author_id, 'followers_count')
+
+
+@receiver(post_save, sender=Subscribe)
+@per_row
+def subscribe_timeline_created(sender, instance, created, **kwargs):
+    # Выполняется после subscribe_created: порог раскладки сравнивается
+    # с уже увеличенным счётчиком подписчиков.
+    if created:
+        timeline.subscribe(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+@per_row
+def subscribe_timeline_deleted(sender, instance, **kwargs):
+    timeline.unsubscribe(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+@per_row
+def recipe_changed(sender, **kwargs):
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+@per_row
+def recipe_search_changed(sender, instance, **kwargs):
+    # Обновление после фиксации: к этому моменту сериализатор уже
+    # сохранил ингредиенты рецепта.
+    search.update_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@per_row
+def ingredient_recipe_search_changed(sender, instance, **kwargs):
+    search.update_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+@per_row
+def ingredient_search_changed(sender, instance, created, **kwargs):
+    if not created:
+        search.update_on_commit(IngredientRecipe.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+@per_row
+def recipe_search_deleted(sender, instance, **kwargs):
+    search.remove([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@per_row
+def ingredient_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+    versions.bump_on_commit(versions.INGREDIENTS)
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@per_row
+def tag_changed(sender, **kwargs):
+    versions.bump_on_commit(versions.TAGS)
+    versions.bump_on_commit(versions.RECIPES)
@@ -0,0 +1,218 @@
+"""Похожие рецепты по ингредиентам и тегам.
+
+Рецепты представляются строками разреженной матрицы «рецепт × признак»:
+признаки — ингредиенты и теги с весом idf (редкий ингредиент говорит о
+сходстве больше, чем соль), теги дополнительно умножаются на TAG_WEIGHT.
+Строки нормируются, поэтому косинусное сходство — это произведение
+матрицы на транспонированную. Произведение считается порциями строк,
+чтобы плотный блок сходств не превышал BLOCK_BYTES, а лучшие
+SIMILAR_RECIPES_COUNT соседей каждого рецепта сохраняются в
+SimilarRecipe.
+
+Команда update_similar_recipes запускается периодически. Без --full
+пересчитываются только рецепты, изменённые после прошлого запуска:
+их собственные списки строятся заново, а в списки остальных рецептов
+они добавляются, если проходят по сходству.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from scipy import sparse
+
+from .models import (
+    DataVersion, IngredientRecipe, Recipe, SimilarRecipe, TagRecipe
+)
+
+# строка DataVersion, в updated_at которой хранится время прошлого запуска
+MARKER = 'similar_recipes'
+TAG_WEIGHT = 0.5
+BLOCK_BYTES = 64 * 1024 * 1024
+CHUNK_SIZE = 1000
+BATCH_SIZE = 5000
+
+
+def features(recipe_ids, rows):
+    """Столбцы признаков и веса idf для пар (recipe_id, feature_id)."""
+    rows = np.asarray(rows, dtype=np.int64).reshape(-1, 2)
+    positions = np.searchsorted(recipe_ids, rows[:, 0])
+    # связи рецептов, созданных после чтения списка рецептов, пропускаются
+    known = positions < len(recipe_ids)
+    known[known] = recipe_ids[positions[known]] == rows[known, 0]
+    rows, positions = rows[known], positions[known]
+    feature_ids, columns = np.unique(rows[:, 1], return_inverse=True)
+    frequency = np.bincount(columns, minlength=len(feature_ids))
+    idf = np.log((1 + len(recipe_ids)) / (1 + frequency)) + 1
+    return positions, columns, idf[columns], len(feature_ids)
+
+
+def build_matrix():
+    """Возвращает отсортированные id рецептов и нормированную матрицу."""
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64)
+    ingredients = features(recipe_ids, list(
+        IngredientRecipe.objects.values_list('recipe_id', 'ingredient_id')))
+    tags = features(recipe_ids, list(
+        TagRecipe.objects.values_list('recipe_id', 'tag_id')))
+    matrix = sparse.csr_matrix(
+        (
+            np.concatenate([ingredients[2], tags[2] * TAG_WEIGHT]),
+            (
+                np.concatenate([ingredients[0], tags[0]]),
+                np.concatenate([ingredients[1], tags[1] + ingredients[3]]),
+            ),
+        ),
+        shape=(len(recipe_ids), ingredients[3] + tags[3]),
+        dtype=np.float32,
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def blocks(matrix, rows):
+    """Плотные блоки сходства строк rows со всеми рецептами."""
+    size = max(1, BLOCK_BYTES // (4 * max(matrix.shape[0], 1)))
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        scores = matrix[chunk].dot(transposed).toarray()
+        # рецепт не похож сам на себя
+        scores[np.arange(len(chunk)), chunk] = 0
+        yield chunk, scores
+
+
+def top_k(scores, k):
+    """Позиции и значения k лучших ненулевых сходств каждой строки."""
+    k = min(k, scores.shape[1])
+    if not k:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return (
+        np.take_along_axis(best, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def save(lists):
+    """Заменяет списки похожих: {recipe_id: [(similar_id, score)]}."""
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=list(lists)).delete()
+        SimilarRecipe.objects.bulk_create(
+            (
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score)
+                for recipe_id, items in lists.items()
+                for similar_id, score in items
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+
+def compute(recipe_ids, matrix, rows, k):
+    """Списки похожих для строк rows и сходства этих строк со всеми."""
+    for chunk, scores in blocks(matrix, rows):
+        best, best_scores = top_k(scores, k)
+        lists = {
+            int(recipe_ids[row]): [
+                (int(recipe_ids[column]), float(score))
+                for column, score in zip(columns, values) if score > 0
+            ]
+            for row, columns, values in zip(chunk, best, best_scores)
+        }
+        yield lists, chunk, scores
+
+
+def thresholds(recipe_ids, k):
+    """Сходство, которое нужно превысить, чтобы попасть в список рецепта.
+
+    Для рецептов с неполным списком это 0.
+    """
+    floor = np.zeros(len(recipe_ids), dtype=np.float32)
+    rows = SimilarRecipe.objects.values('recipe').annotate(
+        total=Count('pk'), lowest=Min('score')
+    ).filter(total__gte=k).values_list('recipe', 'lowest').order_by()
+    for recipe_id, lowest in rows:
+        position = np.searchsorted(recipe_ids, recipe_id)
+        if position < len(recipe_ids) and recipe_ids[position] == recipe_id:
+            floor[position] = lowest
+    return floor
+
+
+def merge(recipe_ids, changed, scores, floor, k):
+    """Вносит изменённые рецепты в списки остальных рецептов.
+
+    scores — сходства изменённых рецептов (строки) со всеми (столбцы).
+    Затрагиваются рецепты, у которых изменённый рецепт уже в списке
+    или сходство с ним выше порога. Новые списки возвращаются порциями.
+    """
+    changed_ids = recipe_ids[changed].tolist()
+    affected = np.flatnonzero((scores > floor).any(axis=0))
+    affected = set(recipe_ids[affected].tolist()) | set(
+        SimilarRecipe.objects.filter(
+            similar__in=changed_ids).values_list('recipe_id', flat=True))
+    affected = sorted(affected - set(changed_ids))
+    for start in range(0, len(affected), CHUNK_SIZE):
+        chunk = affected[start:start + CHUNK_SIZE]
+        lists = {recipe_id: {} for recipe_id in chunk}
+        current = SimilarRecipe.objects.filter(recipe__in=chunk).exclude(
+            similar__in=changed_ids).values_list(
+            'recipe_id', 'similar_id', 'score')
+        for recipe_id, similar_id, score in current:
+            lists[recipe_id][similar_id] = score
+        columns = np.searchsorted(recipe_ids, chunk)
+        for row, changed_id in zip(scores[:, columns].tolist(), changed_ids):
+            for recipe_id, score in zip(chunk, row):
+                if score > 0:
+                    lists[recipe_id][changed_id] = score
+        yield {
+            recipe_id: sorted(
+                items.items(), key=lambda item: (-item[1], item[0]))[:k]
+            for recipe_id, items in lists.items()
+        }
+
+
+def last_run():
+    return DataVersion.objects.filter(name=MARKER).values_list(
+        'updated_at', flat=True).first()
+
+
+def mark(started):
+    DataVersion.objects.get_or_create(name=MARKER)
+    # update(), а не save(): auto_now заменил бы время начала запуска.
+    DataVersion.objects.filter(name=MARKER).update(
+        version=F('version') + 1, updated_at=started)
+
+
+def update(full=False, k=None):
+    """Пересчитывает похожие рецепты и возвращает число обработанных.
+
+    Без full обрабатываются рецепты, изменённые после прошлого запуска;
+    если запусков ещё не было, пересчёт полный.
+    """
+    k = k or settings.SIMILAR_RECIPES_COUNT
+    started = timezone.now()
+    since = None if full else last_run()
+    recipe_ids, matrix = build_matrix()
+    if since is None:
+        rows = np.arange(len(recipe_ids))
+    else:
+        changed = Recipe.objects.filter(updated_at__gte=since).values_list(
+            'pk', flat=True)
+        rows = np.flatnonzero(np.isin(recipe_ids, list(changed)))
+    # Пороги берутся один раз, до записи новых списков, и списки не
+    # хранят соседей за пределами первых k, поэтому инкрементальный
+    # пересчёт приближённый; точный результат даёт полный.
+    floor = None if since is None else thresholds(recipe_ids, k)
+    for lists, chunk, scores in compute(recipe_ids, matrix, rows, k):
+        if floor is not None:
+            for merged in merge(recipe_ids, chunk, scores, floor, k):
+                save(merged)
+        save(lists)
+    mark(started)
+    return len(rows)
@@ -0,0 +1,178 @@
+import io
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from . import counters, deferred, shopping_list
+from .models import (
+    Cart, Ingredient, IngredientRecipe, Recipe, ShoppingListItem
+)
+
+User = get_user_model()
+
+
+class ShoppingListTests(TestCase):
+    """Материализованный список покупок совпадает с корзиной."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.buyer = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name, password='password')
+            for name in ('author', 'buyer')
+        )
+        cls.flour, cls.milk, cls.eggs = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'яйца')
+        )
+        cls.pancakes = cls.create_recipe(
+            'Блины', {cls.flour: 200, cls.milk: 500, cls.eggs: 2})
+        cls.pie = cls.create_recipe('Пирог', {cls.flour: 300, cls.eggs: 3})
+
+    @classmethod
+    def create_recipe(cls, name, amounts):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text=name, cooking_time=30,
+            image='recipes/images/recipe.png')
+        for ingredient, amount in amounts.items():
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+        return recipe
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def add(self, recipe):
+        response = self.client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def assert_list(self, expected):
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(
+                user=self.buyer).values_list('ingredient', 'amount')),
+            {ingredient.pk: amount for ingredient, amount in expected.items()},
+        )
+        self.assertEqual(shopping_list.find_drift(), {})
+        self.assertFalse(any(counters.find_drift().values()))
+
+    def test_add_to_cart(self):
+        self.add(self.pancakes)
+        self.assert_list({self.flour: 200, self.milk: 500, self.eggs: 2})
+        self.add(self.pie)
+        self.assert_list({self.flour: 500, self.milk: 500, self.eggs: 5})
+
+    def test_remove_from_cart(self):
+        self.add(self.pancakes)
+        self.add(self.pie)
+        response = self.client.delete(
+            f'/api/recipes/{self.pancakes.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_list({self.flour: 300, self.eggs: 3})
+        Cart.objects.filter(user=self.buyer).delete()
+        self.assert_list({})
+
+    def test_edit_recipe_ingredients(self):
+        self.add(self.pancakes)
+        self.add(self.pie)
+        row = IngredientRecipe.objects.get(
+            recipe=self.pie, ingredient=self.flour)
+        row.amount = 350
+        row.save()
+        IngredientRecipe.objects.filter(
+            recipe=self.pancakes, ingredient=self.milk).delete()
+        IngredientRecipe.objects.create(
+            recipe=self.pie, ingredient=self.milk, amount=100)
+        self.assert_list({self.flour: 550, self.milk: 100, self.eggs: 5})
+
+    def test_edit_recipe_through_api(self):
+        self.add(self.pancakes)
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.patch(
+            f'/api/recipes/{self.pancakes.pk}/',
+            {'ingredients': [
+                {'id': self.flour.pk, 'amount': 250},
+                {'id': self.eggs.pk, 'amount': 2},
+            ]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_list({self.flour: 250, self.eggs: 2})
+
+    def test_delete_recipe(self):
+        self.add(self.pancakes)
+        self.add(self.pie)
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.delete(f'/api/recipes/{self.pie.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_list({self.flour: 200, self.milk: 500, self.eggs: 2})
+
+
+class DeferredTests(TestCase):
+    """deferred.collect вызывает действие один раз после фиксации."""
+
+    def setUp(self):
+        self.calls = []
+
+    def action(self, values):
+        self.calls.append(values)
+
+    def test_collects_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            deferred.collect(self.action, [3])
+            deferred.collect(self.action, [1, 3])
+            self.assertEqual(self.calls, [])
+        self.assertEqual(self.calls, [[1, 3]])
+
+    def test_after_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    deferred.collect(self.action, [1])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            deferred.collect(self.action, [2])
+        self.assertEqual(self.calls, [[1, 2]])
+
+
+class ImportIngredientsTests(TestCase):
+    """Команда import_ingredients на корректных и ошибочных файлах."""
+
+    def import_file(self, suffix, content):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'ingredients{suffix}')
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.write(content)
+            call_command('import_ingredients', path, stdout=io.StringIO())
+
+    def test_csv(self):
+        self.import_file('.csv', 'name,measurement_unit\nмука,г\nмука,г\n')
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', 'measurement_unit')),
+            [('мука', 'г')])
+
+    def test_json(self):
+        self.import_file(
+            '.json', '[{"name": "мука", "measurement_unit": "г"}]')
+        self.assertTrue(Ingredient.objects.filter(name='мука').exists())
+
+    def test_csv_short_row(self):
+        with self.assertRaisesMessage(CommandError, 'Строка 3'):
+            self.import_file('.csv', 'мука,г\nсоль,г\nсахар\n')
+
+    def test_json_bad_record(self):
+        with self.assertRaisesMessage(CommandError, 'Элемент 2'):
+            self.import_file(
+                '.json', '[{"name": "мука", "measurement_unit": "г"}, '
+                '{"name": "соль"}]')
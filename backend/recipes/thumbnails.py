@@ -0,0 +1,170 @@
+"""Уменьшенные копии изображений рецептов.
+
+Для каждого изображения строятся варианты card, detail и retina в
+форматах WebP и JPEG. Генерация выполняется в пуле процессов, чтобы
+не занимать воркер, обрабатывающий запрос; дочерние процессы работают
+только с файловым хранилищем, а отметку has_thumbnails в БД ставит
+родительский процесс после успешного завершения задачи.
+"""
+import functools
+import io
+import logging
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import versions
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# вариант: наибольшие ширина и высота
+VARIANTS = {
+    'card': (480, 480),
+    'detail': (960, 960),
+    'retina': (1920, 1920),
+}
+# формат Pillow: расширение файла
+FORMATS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+DIRECTORY = 'recipes/thumbnails'
+QUALITY = 82
+
+_executor = None
+_lock = threading.Lock()
+
+
+def variant_name(name, variant, extension):
+    return f'{DIRECTORY}/{PurePosixPath(name).stem}_{variant}.{extension}'
+
+
+def variant_names(name):
+    """Возвращает {вариант: {расширение: имя файла}} для изображения."""
+    return {
+        variant: {
+            extension: variant_name(name, variant, extension)
+            for extension in FORMATS.values()
+        }
+        for variant in VARIANTS
+    }
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def normalize(file):
+    """Перекодирует загруженный оригинал с ограничением размеров.
+
+    Изображение поворачивается по EXIF и уменьшается до
+    RECIPE_IMAGE_MAX_SIDE по большей стороне. Непрозрачные изображения
+    сохраняются в JPEG, с прозрачностью — в PNG. Возвращает ContentFile
+    или бросает ValueError, если файл не является допустимым
+    изображением.
+    """
+    try:
+        with Image.open(file) as image:
+            if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                raise ValueError('Слишком большое изображение.')
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((settings.RECIPE_IMAGE_MAX_SIDE,) * 2)
+            if image.mode in ('RGBA', 'LA', 'P') and (
+                    image.mode != 'P' or 'transparency' in image.info):
+                content = encode(image.convert('RGBA'), 'PNG')
+                extension = 'png'
+            else:
+                content = encode(image.convert('RGB'), 'JPEG')
+                extension = 'jpg'
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('Загрузите корректное изображение.')
+    return ContentFile(content, name=f'{uuid.uuid4().hex}.{extension}')
+
+
+def generate(name):
+    """Строит все варианты изображения name. Выполняется в пуле."""
+    with default_storage.open(name) as file, Image.open(file) as original:
+        original.load()
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for variant, size in VARIANTS.items():
+            image = original.copy()
+            image.thumbnail(size)
+            for image_format, extension in FORMATS.items():
+                source = image
+                if image_format == 'JPEG':
+                    source = image.convert('RGB')
+                target = variant_name(name, variant, extension)
+                if default_storage.exists(target):
+                    default_storage.delete(target)
+                default_storage.save(
+                    target, ContentFile(encode(source, image_format)))
+    return name
+
+
+def mark_ready(names):
+    """Отмечает рецепты, для изображений которых готовы варианты."""
+    updated = Recipe.objects.filter(image__in=names).update(
+        has_thumbnails=True)
+    if updated:
+        versions.bump(versions.RECIPES)
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS)
+        return _executor
+
+
+def reset_executor():
+    global _executor
+    with _lock:
+        _executor = None
+
+
+def done(future, submitter):
+    try:
+        mark_ready([future.result()])
+    except BrokenProcessPool:
+        reset_executor()
+        logger.exception('Пул генерации миниатюр остановлен')
+    except Exception:
+        logger.exception('Не удалось построить миниатюры')
+    finally:
+        # Обычно колбэк выполняется в служебном потоке пула со своим
+        # соединением с БД, которое не нужно держать открытым.
+        if threading.get_ident() != submitter:
+            connections.close_all()
+
+
+def schedule(name):
+    """Ставит генерацию вариантов в очередь пула процессов.
+
+    При THUMBNAIL_WORKERS = 0 варианты строятся сразу в текущем
+    процессе.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        mark_ready([generate(name)])
+        return
+    try:
+        future = get_executor().submit(generate, name)
+    except BrokenProcessPool:
+        reset_executor()
+        future = get_executor().submit(generate, name)
+    future.add_done_callback(
+        functools.partial(done, submitter=threading.get_ident()))
+
+
+def schedule_on_commit(name):
+    transaction.on_commit(lambda: schedule(name))
@@ -0,0 +1,220 @@
+"""Ленты рецептов от авторов, на которых подписан пользователь.
+
+Новый рецепт раскладывается по лентам подписчиков (TimelineEntry) в
+пуле потоков после фиксации транзакции, поэтому лента читается одним
+запросом по индексу, без соединения Subscribe и Recipe. Рецепты
+авторов, у которых не меньше TIMELINE_FANOUT_LIMIT подписчиков, не
+раскладываются: при чтении ленты они выбираются по индексу рецептов
+автора и сливаются с сохранённой лентой. Каждая лента ограничена
+TIMELINE_LENGTH последними рецептами.
+
+Раскладка в пуле не переживает перезапуск процесса; пропущенные записи
+и изменения после смены порога восстанавливает команда
+rebuild_timelines.
+"""
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from users.models import Subscribe
+
+from .models import Recipe, TimelineEntry
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+_executor = None
+_lock = threading.Lock()
+
+
+def is_celebrity(followers_count):
+    return followers_count >= settings.TIMELINE_FANOUT_LIMIT
+
+
+def celebrities(user):
+    """id авторов из подписок пользователя, читаемых при запросе ленты."""
+    return Subscribe.objects.filter(
+        user=user,
+        author__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('author')
+
+
+def trim(user_ids):
+    """Удаляет из лент записи сверх TIMELINE_LENGTH последних."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    table = TimelineEntry._meta.db_table
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY user_id ORDER BY pub_date DESC, recipe_id DESC'
+            f') AS position FROM {table} WHERE user_id IN ({placeholders})'
+            f') ranked WHERE position > %s)',
+            [*user_ids, settings.TIMELINE_LENGTH])
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'pub_date', 'author_id', 'author__followers_count').first()
+    if recipe is None or is_celebrity(recipe['author__followers_count']):
+        return
+    followers = Subscribe.objects.filter(
+        author=recipe['author_id']).order_by('user').values_list(
+        'user_id', flat=True)
+    last = 0
+    while True:
+        chunk = list(followers.filter(user__gt=last)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                (
+                    TimelineEntry(
+                        user_id=user_id, recipe_id=recipe_id,
+                        pub_date=recipe['pub_date'])
+                    for user_id in chunk
+                ),
+                ignore_conflicts=True,
+            )
+            trim(chunk)
+        last = chunk[-1]
+
+
+def rebuild(user_ids):
+    """Строит ленты пользователей заново по текущим подпискам."""
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user__in=user_ids).delete()
+        for user_id in user_ids:
+            recipes = Recipe.objects.filter(
+                author__following__user=user_id,
+                author__followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+            ).order_by('-pub_date', '-id').values_list('id', 'pub_date')
+            TimelineEntry.objects.bulk_create(
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+                for recipe_id, pub_date in recipes[:settings.TIMELINE_LENGTH]
+            )
+
+
+def subscribe(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    followers_count = User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True).first()
+    if followers_count is None or is_celebrity(followers_count):
+        return
+    recipes = Recipe.objects.filter(author=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes[:settings.TIMELINE_LENGTH]
+        ),
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def unsubscribe(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user=user_id, recipe__author=author_id).delete()
+
+
+def after(queryset, id_field, cursor):
+    """Записи по порядку (pub_date, id) после курсора пагинации.
+
+    cursor — тройка (pub_date, id, reverse) или None; при reverse
+    записи идут в обратную сторону, к более новым.
+
+    Условие по одному pub_date дублирует составное: по нему планировщик
+    начинает просмотр индекса с позиции курсора, а не с начала, и
+    глубокие страницы читаются так же быстро, как первая.
+    """
+    if cursor is None:
+        return queryset.order_by('-pub_date', f'-{id_field}')
+    pub_date, pk, reverse = cursor
+    if reverse:
+        return queryset.filter(
+            Q(pub_date__gt=pub_date)
+            | Q(pub_date=pub_date, **{f'{id_field}__gt': pk}),
+            pub_date__gte=pub_date,
+        ).order_by('pub_date', id_field)
+    return queryset.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, **{f'{id_field}__lt': pk}),
+        pub_date__lte=pub_date,
+    ).order_by('-pub_date', f'-{id_field}')
+
+
+class Feed:
+    """Лента пользователя: сохранённые записи и рецепты популярных авторов.
+
+    recipes — queryset рецептов с нужными для ответа аннотациями.
+    """
+
+    def __init__(self, user, recipes):
+        self.user = user
+        self.recipes = recipes
+
+    def page(self, cursor, limit):
+        """До limit рецептов после курсора, по убыванию даты."""
+        keys = set(after(
+            TimelineEntry.objects.filter(user=self.user), 'recipe_id', cursor
+        ).values_list('pub_date', 'recipe_id')[:limit])
+        keys.update(after(
+            Recipe.objects.filter(author__in=celebrities(self.user)),
+            'id', cursor,
+        ).values_list('pub_date', 'id')[:limit])
+        reverse = cursor is not None and cursor[2]
+        keys = sorted(keys, reverse=not reverse)[:limit]
+        recipes = self.recipes.in_bulk([pk for _, pk in keys])
+        return [recipes[pk] for _, pk in keys if pk in recipes]
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_WORKERS,
+                thread_name_prefix='timeline',
+            )
+        return _executor
+
+
+def run(recipe_id):
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception('Не удалось разложить рецепт %s по лентам', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(recipe_id):
+    """Ставит раскладку рецепта по лентам в очередь пула потоков.
+
+    При TIMELINE_WORKERS = 0 раскладка выполняется сразу.
+    """
+    if not settings.TIMELINE_WORKERS:
+        fan_out(recipe_id)
+        return
+    get_executor().submit(run, recipe_id)
+
+
+def schedule_on_commit(recipe_id):
+    transaction.on_commit(functools.partial(schedule, recipe_id))
@@ -0,0 +1,43 @@
+"""Счётчики версий наборов данных.
+
+Версия увеличивается при каждом изменении набора и используется как
+признак актуальности кэша: ETag справочников, ключи кэша ответов.
+Счётчики хранятся в БД, поэтому общие для всех процессов gunicorn.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from . import deferred
+from .models import DataVersion
+
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+
+
+def get(name):
+    """Возвращает пару (версия, дата изменения) набора данных."""
+    row = DataVersion.objects.filter(name=name).values_list(
+        'version', 'updated_at').first()
+    return row or (0, None)
+
+
+def bump(name):
+    updated = DataVersion.objects.filter(name=name).update(
+        version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+def bump_all(names):
+    for name in names:
+        bump(name)
+
+
+def bump_on_commit(name):
+    """Увеличивает версию после фиксации текущей транзакции.
+
+    Сколько бы раз версия ни менялась в транзакции, она увеличивается
+    на единицу.
+    """
+    deferred.collect(bump_all, [name])
@@ -29,6 +29,12 @@ class User(AbstractUser):
     password = models.CharField(
         verbose_name='Пароль', max_length=150,
     )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков', default=0, editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов', default=0, editable=False,
+    )
 
     def clean(self):
         super().clean()
@@ -45,10 +51,12 @@ class User(AbstractUser):
 
 
 class Subscribe(models.Model):
+    # индекс по user_id даёт ограничение unique_subscribe
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
+        db_index=False,
         verbose_name='Пользователь',
     )
     author = models.ForeignKey(
@@ -10,6 +10,8 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from recipes.models import Recipe
+
 from .models import Subscribe
 
 User = get_user_model()
@@ -29,14 +31,47 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         following = User.objects.filter(
             following__user=request.user).order_by('pk')
-        recipes_limit = self.request.query_params.get('recipes_limit')
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
         pagination = self.paginate_queryset(following)
+        previews = self.get_recipe_previews(
+            [author.pk for author in pagination], recipes_limit)
+        for author in pagination:
+            author.recipes_preview = previews.get(author.pk, [])
         serializer = SubscribeSerializer(
             pagination, many=True,
             context={'request': request, 'recipes_limit': recipes_limit}
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_recipe_previews(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом."""
+        if not author_ids:
+            return {}
+        if limit is None or limit < 0:
+            recipes = Recipe.objects.filter(author_id__in=author_ids)
+        else:
+            recipes = Recipe.objects.raw(
+                'SELECT id, name, image, has_thumbnails, cooking_time,'
+                '  author_id FROM ('
+                '  SELECT id, name, image, has_thumbnails, cooking_time,'
+                '    author_id,'
+                '    ROW_NUMBER() OVER ('
+                '      PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                '    ) AS row_number'
+                f'  FROM {Recipe._meta.db_table}'
+                f'  WHERE author_id IN ({", ".join(["%s"] * len(author_ids))})'
+                ') AS ranked WHERE row_number <= %s '
+                'ORDER BY author_id, row_number',
+                [*author_ids, limit],
+            )
+        previews = {}
+        for recipe in recipes:
+            previews.setdefault(recipe.author_id, []).append(recipe)
+        return previews
+
     @action(
         detail=True, methods=['POST', 'DELETE'],
         permission_classes=[IsAuthenticated]